@@ -1,25 +1,110 @@
 # backend.py
 import os
 import random
-import time
-from fastapi import FastAPI
+import socket
+import sys
+from fastapi import Body, FastAPI, Header
+from fastapi.responses import JSONResponse
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from announce import Announcer  # noqa: E402  (backend/announce.py)
+from faults import FaultInjector, admin_router  # noqa: E402  (backend/faults.py)
+from workload import Workload  # noqa: E402  (backend/workload.py)
+
 app = FastAPI()
 
 # Simulated latency parameters from env
 MEAN_MS = float(os.getenv("MEAN_MS", "50"))
 STD_MS = float(os.getenv("STD_MS", "10"))
 FAIL_RATE = float(os.getenv("FAIL_RATE", "0.0"))
+# a batch of n items costs one sampled delay * n**BATCH_EXPONENT (sublinear for < 1)
+BATCH_EXPONENT = float(os.getenv("BATCH_EXPONENT", "0.5"))
+MAX_BATCH = int(os.getenv("MAX_BATCH", "64"))
+# simulated model output: a vector of PAYLOAD_FLOATS floats in every /predict answer (0 = none)
+PAYLOAD = [random.random() for _ in range(int(os.getenv("PAYLOAD_FLOATS", "0")))]
+
+# WORKLOAD_MODE: io (async sleep) | cpu (spin in CPU_POOL=process|thread workers)
+# LATENCY_DIST: normal | uniform | lognormal | bimodal; CAPACITY: concurrent requests (0 = unlimited)
+WORKLOAD = Workload(
+    mode=os.getenv("WORKLOAD_MODE", "io"),
+    dist=os.getenv("LATENCY_DIST", "normal"),
+    mean_ms=MEAN_MS,
+    std_ms=STD_MS,
+    bimodal_p=float(os.getenv("BIMODAL_P", "0.1")),
+    bimodal_mult=float(os.getenv("BIMODAL_MULT", "5")),
+    spike_p=float(os.getenv("SPIKE_P", "0.0")),
+    spike_mult=float(os.getenv("SPIKE_MULT", "10")),
+    capacity=int(os.getenv("CAPACITY", "8")),
+    cpu_pool=os.getenv("CPU_POOL", "process"),
+    cpu_workers=int(os.getenv("CPU_WORKERS", "2")),
+)
+
+# MANAGER_URL set: register as BACKEND_NAME at ADVERTISE_URL and heartbeat (backend/announce.py)
+MANAGER_URL = os.getenv("MANAGER_URL", "")
+ADVERTISE_URL = os.getenv("ADVERTISE_URL", f"http://{socket.gethostname()}:{os.getenv('PORT', '8101')}")
+ANNOUNCE_TTL_S = float(os.getenv("ANNOUNCE_TTL_S", "0")) or None  # 0 = the manager's default
+
+# latency, error rate and slowness can be changed at runtime through /admin/faults
+FAULTS = FaultInjector(WORKLOAD, error_rate=FAIL_RATE)
+app.include_router(admin_router(lambda: FAULTS))
+
+def _deadline_exceeded():
+    # the caller will have given up before we finish: don't do the work
+    return JSONResponse({"status": "error", "msg": "deadline exceeded"}, status_code=504,
+                        headers={"x-deadline-exceeded": "1"})
+
+@app.on_event("startup")
+async def startup():
+    app.state.announcer = None
+    if MANAGER_URL:
+        app.state.announcer = Announcer(MANAGER_URL, os.getenv("BACKEND_NAME", "backend"), ADVERTISE_URL,
+                                        path="/predict", ttl_s=ANNOUNCE_TTL_S)
+        app.state.announcer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if app.state.announcer is not None:
+        await app.state.announcer.close()  # leave before going away, not after the ttl
+    WORKLOAD.close()
+
+@app.get("/healthz")
+async def healthz():
+    # no simulated work; injected errors still count so probes notice a failing backend
+    if FAULTS.should_fail():
+        return JSONResponse({"status": "error", "msg": "simulated failure"}, status_code=503)
+    return {"status": "ok", "busy": WORKLOAD.busy, "queued": WORKLOAD.queued}
 
 @app.get("/predict")
-async def predict():
+async def predict(x_deadline_ms: float = Header(None)):
     # simulate latency
-    delay = max(0.0, random.gauss(MEAN_MS, STD_MS) / 1000.0)
-    time.sleep(delay)
-    if random.random() < FAIL_RATE:
-        return {"status": "error", "msg": "simulated failure"}
-    return {"status": "ok", "latency_s": delay, "backend": os.getenv("BACKEND_NAME", "backend")}
+    delay = FAULTS.sample_ms() / 1000.0
+    if not await WORKLOAD.run(delay * 1000.0, x_deadline_ms):
+        return _deadline_exceeded()
+    if FAULTS.should_fail():
+        # a real 5xx, so the router's breaker, retries and outlier tracking count it
+        return JSONResponse({"status": "error", "msg": "simulated failure"}, status_code=500)
+    result = {"status": "ok", "latency_s": delay, "backend": os.getenv("BACKEND_NAME", "backend")}
+    if PAYLOAD:
+        result["prediction"] = PAYLOAD
+    return result
+
+@app.post("/predict/batch")
+async def predict_batch(body: dict = Body(...), x_deadline_ms: float = Header(None)):
+    items = body.get("items") or []
+    if len(items) > MAX_BATCH:
+        return JSONResponse({"status": "error", "msg": f"batch larger than {MAX_BATCH}"}, status_code=413)
+    delay = FAULTS.sample_ms() / 1000.0 * max(1, len(items)) ** BATCH_EXPONENT
+    if not await WORKLOAD.run(delay * 1000.0, x_deadline_ms):
+        return _deadline_exceeded()
+    backend = os.getenv("BACKEND_NAME", "backend")
+    results = []
+    for _ in items:
+        if FAULTS.should_fail():
+            results.append({"status": "error", "msg": "simulated failure", "status_code": 500})
+        else:
+            results.append({"status": "ok", "latency_s": delay, "batch_size": len(items), "backend": backend})
+    return {"results": results}
 
 if __name__ == "__main__":
     uvicorn.run("backend:app", host="0.0.0.0", port=int(os.getenv("PORT", 8101)), log_level="info")
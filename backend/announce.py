@@ -0,0 +1,66 @@
+# backend/announce.py
+# Self-registration with the manager (manager/registry.py): PUT /backends/{name}
+# with our url and the path we serve predictions on at startup, a heartbeat every
+# heartbeat_s the manager hands back, a fresh registration whenever it answers 404
+# (it restarted or expired us) and DELETE on a clean shutdown. An unreachable manager is not fatal: we keep
+# retrying, and until the ttl runs out it keeps routing to us anyway.
+import asyncio
+import logging
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+class Announcer:
+    def __init__(self, manager_url, name, url, path=None, ttl_s=None, retry_s=2.0, timeout_s=2.0):
+        self.name = name
+        self.url = url
+        self.path = path  # routers send predictions here (and batches to path + "/batch")
+        self.ttl_s = ttl_s  # None: the manager's default
+        self.retry_s = retry_s
+        self.client = httpx.AsyncClient(base_url=manager_url.rstrip("/"), timeout=timeout_s)
+        self.registered = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _register(self):
+        body = {"url": self.url}
+        if self.path:
+            body["path"] = self.path
+        if self.ttl_s:
+            body["ttl_s"] = self.ttl_s
+        r = await self.client.put(f"/backends/{self.name}", json=body)
+        r.raise_for_status()
+        self.registered = True
+        log.info("registered %s (%s) with the manager", self.name, self.url)
+        return float(r.json()["heartbeat_s"])
+
+    async def _run(self):
+        heartbeat_s = None  # None until registered
+        while True:
+            try:
+                if heartbeat_s is None:
+                    heartbeat_s = await self._register()
+                else:
+                    r = await self.client.post(f"/backends/{self.name}/heartbeat")
+                    if r.status_code == 404:
+                        heartbeat_s = None
+                        continue
+                    r.raise_for_status()
+            except Exception as e:
+                log.warning("manager unreachable for %s: %s", self.name, e)
+                await asyncio.sleep(min(self.retry_s, heartbeat_s or self.retry_s))
+                continue
+            await asyncio.sleep(heartbeat_s)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self.registered:
+            try:
+                await self.client.delete(f"/backends/{self.name}")  # leave now rather than after the ttl
+            except Exception:
+                pass
+        await self.client.aclose()
@@ -1,32 +1,98 @@
 # backend/app.py
 import argparse
-import random
 import time
-from fastapi import FastAPI, HTTPException
+from fastapi import Body, FastAPI, Header, HTTPException
 import uvicorn
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
+
+from announce import Announcer
+from faults import FaultInjector, admin_router
+from workload import DISTRIBUTIONS, MODES, Workload
 
 app = FastAPI()
+app.include_router(admin_router(lambda: app.state.faults))
 REQUESTS = Counter("backend_requests_total", "Total requests")
 LATENCY = Histogram("backend_latency_seconds", "Backend latency seconds")
 ERRORS = Counter("backend_errors_total", "Backend errors")
+DEADLINE_SKIPPED = Counter("backend_deadline_skipped_total", "Requests refused because they could not finish within x-deadline-ms")
+BATCH_SIZE = Histogram("backend_batch_size", "Items per /infer/batch call", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+QUEUED = Gauge("backend_queue_depth", "Requests waiting for a free capacity slot")
+BUSY = Gauge("backend_busy", "Requests currently being worked on")
 HEALTH = Gauge("backend_health_status", "1=healthy,0=unhealthy")
 
 @app.get("/infer")
-async def infer():
+async def infer(x_deadline_ms: float = Header(None)):
     REQUESTS.inc()
     start = time.time()
-    if random.random() < app.state.error_rate:
+    if app.state.faults.should_fail():
         ERRORS.inc()
         HEALTH.set(0)
         raise HTTPException(status_code=500, detail="simulated error")
-    wait = max(0, random.uniform(-app.state.jitter, app.state.jitter) + app.state.latency) / 1000.0
-    time.sleep(wait)
+    wait = app.state.faults.sample_ms() / 1000.0
+    if not await app.state.workload.run(wait * 1000.0, x_deadline_ms):
+        # the router will have given up before we finish: skip the work
+        DEADLINE_SKIPPED.inc()
+        raise HTTPException(status_code=504, detail="deadline exceeded", headers={"x-deadline-exceeded": "1"})
     LATENCY.observe(time.time() - start)
     HEALTH.set(1)
     return {"status": "ok", "backend_port": app.state.port, "latency_ms": wait*1000}
 
+@app.post("/infer/batch")
+async def infer_batch(body: dict = Body(...), x_deadline_ms: float = Header(None)):
+    # one model call for the whole batch: n items cost latency * n**batch_exponent
+    items = body.get("items") or []
+    if len(items) > app.state.max_batch:
+        raise HTTPException(status_code=413, detail=f"batch larger than {app.state.max_batch}")
+    REQUESTS.inc(len(items))
+    BATCH_SIZE.observe(len(items))
+    start = time.time()
+    if app.state.faults.should_fail():
+        ERRORS.inc()
+        HEALTH.set(0)
+        raise HTTPException(status_code=500, detail="simulated error")
+    wait = app.state.faults.sample_ms() / 1000.0 * max(1, len(items)) ** app.state.batch_exponent
+    if not await app.state.workload.run(wait * 1000.0, x_deadline_ms):
+        DEADLINE_SKIPPED.inc(len(items))
+        raise HTTPException(status_code=504, detail="deadline exceeded", headers={"x-deadline-exceeded": "1"})
+    LATENCY.observe(time.time() - start)
+    HEALTH.set(1)
+    result = {"status": "ok", "backend_port": app.state.port, "latency_ms": wait*1000, "batch_size": len(items)}
+    return {"results": [result] * len(items)}
+
+@app.get("/healthz")
+async def healthz():
+    # cheap liveness for the manager's probes: no simulated work, but an injected
+    # error rate still shows up here so a failing backend is noticed between inference probes
+    load = {"busy": app.state.workload.busy, "queued": app.state.workload.queued}
+    if app.state.draining:
+        return JSONResponse({"status": "draining", **load}, status_code=503)
+    if app.state.faults.should_fail():
+        raise HTTPException(status_code=503, detail="simulated error")
+    return {"status": "ok", **load}
+
+@app.post("/admin/drain")
+async def drain():
+    # before a scale-down: leave the manager now so routers stop picking us and fail health
+    # checks; requests already here still finish. Stop the process once /healthz shows busy
+    # and queued at 0.
+    app.state.draining = True
+    if app.state.announcer is not None:
+        await app.state.announcer.close()
+        app.state.announcer = None
+    return {"status": "draining", "busy": app.state.workload.busy, "queued": app.state.workload.queued}
+
+@app.on_event("startup")
+async def startup():
+    if app.state.announcer is not None:
+        app.state.announcer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if app.state.announcer is not None:
+        await app.state.announcer.close()  # leave before going away, not after the ttl
+    app.state.workload.close()
+
 @app.get("/metrics")
 def metrics():
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -37,9 +103,37 @@ if __name__ == "__main__":
     p.add_argument("--latency", type=int, default=100)
     p.add_argument("--jitter", type=int, default=20)
     p.add_argument("--error", type=float, default=0.01)
+    p.add_argument("--batch-exponent", type=float, default=0.5)
+    p.add_argument("--max-batch", type=int, default=64)
+    p.add_argument("--mode", choices=MODES, default="io", help="io: async sleep, cpu: spin in a worker pool")
+    p.add_argument("--dist", choices=DISTRIBUTIONS, default="uniform", help="uniform = latency +- jitter")
+    p.add_argument("--bimodal-p", type=float, default=0.1)
+    p.add_argument("--bimodal-mult", type=float, default=5.0)
+    p.add_argument("--spike-p", type=float, default=0.0)
+    p.add_argument("--spike-mult", type=float, default=10.0)
+    p.add_argument("--capacity", type=int, default=8, help="concurrent requests before queueing (0 = unlimited)")
+    p.add_argument("--cpu-pool", choices=("process", "thread"), default="process")
+    p.add_argument("--cpu-workers", type=int, default=2)
+    p.add_argument("--manager", default="", help="manager url to register with and heartbeat, e.g. http://127.0.0.1:8001")
+    p.add_argument("--name", help="name to register as (default backend-<port>)")
+    p.add_argument("--advertise-url", help="url the routers should use (default http://127.0.0.1:<port>)")
+    p.add_argument("--ttl", type=float, default=None, help="heartbeat ttl in seconds (default: the manager's)")
     args = p.parse_args()
-    app.state.latency = args.latency
-    app.state.jitter = args.jitter
-    app.state.error_rate = args.error
+    app.state.workload = Workload(
+        mode=args.mode, dist=args.dist, mean_ms=args.latency, std_ms=args.jitter,
+        bimodal_p=args.bimodal_p, bimodal_mult=args.bimodal_mult, spike_p=args.spike_p, spike_mult=args.spike_mult,
+        capacity=args.capacity, cpu_pool=args.cpu_pool, cpu_workers=args.cpu_workers,
+    )
+    app.state.faults = FaultInjector(app.state.workload, error_rate=args.error)
+    QUEUED.set_function(lambda: app.state.workload.queued)
+    BUSY.set_function(lambda: app.state.workload.busy)
+    app.state.batch_exponent = args.batch_exponent
+    app.state.max_batch = args.max_batch
     app.state.port = args.port
+    app.state.draining = False
+    app.state.announcer = None
+    if args.manager:
+        app.state.announcer = Announcer(args.manager, args.name or f"backend-{args.port}",
+                                        args.advertise_url or f"http://127.0.0.1:{args.port}", path="/infer",
+                                        ttl_s=args.ttl)
     uvicorn.run(app, host="0.0.0.0", port=args.port)
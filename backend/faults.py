@@ -0,0 +1,153 @@
+# backend/faults.py
+# Runtime fault injection for the backend simulators. The admin API changes
+# latency, error rate and slowness while the backend is serving, either at
+# once or following a timed schedule, so benchmarks can watch the router
+# react to a backend that degrades mid-run.
+#
+#   GET    /admin/faults           current values, baseline and running schedules
+#   POST   /admin/faults           {"error_rate": 0.3, "mean_ms": 200, ...} set now
+#   POST   /admin/faults/schedule  {"param": "error_rate", "shape": "ramp", "from": 0, "to": 0.5, "duration_s": 30}
+#   DELETE /admin/faults           cancel schedules and restore the startup values
+import asyncio
+import math
+import random
+import time
+
+from fastapi import APIRouter, Body, HTTPException
+
+# mean_ms/std_ms: latency distribution; latency_mult: brownout (everything slower);
+# slow_p/slow_mult: partial slowness (that share of requests slow_mult x slower)
+PARAMS = ("mean_ms", "std_ms", "error_rate", "latency_mult", "slow_p", "slow_mult")
+SHAPES = ("ramp", "step", "flap")
+
+def shape_value(shape, start, end, t, duration_s, steps=1, period_s=None):
+    """
+    ramp - linear from start to end over duration_s, then stays at end
+    step - `steps` equal jumps from start to end, the last one at duration_s
+    flap - alternates end / start every period_s / 2 for duration_s, then back to start
+    """
+    if shape == "ramp":
+        return start + (end - start) * min(1.0, t / duration_s) if duration_s > 0 else end
+    if shape == "step":
+        done = min(steps, math.floor(t / duration_s * steps)) if duration_s > 0 else steps
+        return start + (end - start) * done / steps
+    if shape == "flap":
+        if t >= duration_s:
+            return start
+        period_s = period_s or duration_s
+        return end if (t % period_s) < period_s / 2 else start
+    raise ValueError(f"unknown shape {shape!r}, expected one of {SHAPES}")
+
+class FaultInjector:
+    def __init__(self, workload, error_rate=0.0, tick_s=0.1):
+        self.workload = workload  # mean_ms/std_ms live on the workload
+        self.error_rate = error_rate
+        self.latency_mult = 1.0
+        self.slow_p = 0.0
+        self.slow_mult = 5.0
+        self.tick_s = tick_s
+        self.baseline = self.values()
+        self.schedules = {}  # param -> (task, spec)
+
+    def values(self):
+        return {p: getattr(self.workload if p in ("mean_ms", "std_ms") else self, p) for p in PARAMS}
+
+    @staticmethod
+    def _check(name, value):
+        if name not in PARAMS:
+            raise ValueError(f"unknown fault parameter {name!r}, expected one of {PARAMS}")
+        value = float(value)
+        if value < 0 or (name in ("error_rate", "slow_p") and value > 1):
+            raise ValueError(f"{name}={value} out of range")
+        return value
+
+    def set(self, **values):
+        values = {name: self._check(name, value) for name, value in values.items()}  # all or nothing
+        for name, value in values.items():
+            setattr(self.workload if name in ("mean_ms", "std_ms") else self, name, value)
+
+    def sample_ms(self):
+        ms = self.workload.sample_ms() * self.latency_mult
+        if self.slow_p and random.random() < self.slow_p:
+            ms *= self.slow_mult
+        return ms
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+    def schedule(self, param, shape, start=None, end=None, duration_s=10.0, steps=1, period_s=None):
+        if param not in PARAMS:
+            raise ValueError(f"unknown fault parameter {param!r}, expected one of {PARAMS}")
+        if shape not in SHAPES:
+            raise ValueError(f"unknown shape {shape!r}, expected one of {SHAPES}")
+        if end is None:
+            raise ValueError("schedule needs an end value ('to')")
+        start = self._check(param, self.values()[param] if start is None else start)
+        spec = {"param": param, "shape": shape, "from": start, "to": self._check(param, end),
+                "duration_s": float(duration_s), "steps": max(1, int(steps)),
+                "period_s": float(period_s) if period_s else None, "started_at": time.time()}
+        self.cancel(param)  # one schedule per parameter; the newest wins
+        task = asyncio.ensure_future(self._run(spec))
+        self.schedules[param] = (task, spec)
+        return spec
+
+    async def _run(self, spec):
+        t0 = time.monotonic()
+        try:
+            while True:
+                t = time.monotonic() - t0
+                self.set(**{spec["param"]: shape_value(spec["shape"], spec["from"], spec["to"], t, spec["duration_s"],
+                                                       spec["steps"], spec["period_s"])})
+                if t >= spec["duration_s"]:
+                    return
+                await asyncio.sleep(self.tick_s)
+        finally:
+            if self.schedules.get(spec["param"], (None, None))[1] is spec:
+                del self.schedules[spec["param"]]
+
+    def cancel(self, param):
+        entry = self.schedules.pop(param, None)
+        if entry is not None:
+            entry[0].cancel()
+
+    def reset(self):
+        for param in list(self.schedules):
+            self.cancel(param)
+        self.set(**self.baseline)
+
+    def describe(self):
+        return {"values": self.values(), "baseline": self.baseline,
+                "schedules": [spec for _, spec in self.schedules.values()]}
+
+def admin_router(get_injector):
+    # get_injector() -> the FaultInjector of the running app
+    router = APIRouter(prefix="/admin/faults")
+
+    @router.get("")
+    async def get_faults():
+        return get_injector().describe()
+
+    @router.post("")
+    async def set_faults(body: dict = Body(...)):
+        try:
+            get_injector().set(**body)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return get_injector().describe()
+
+    @router.post("/schedule")
+    async def schedule_fault(body: dict = Body(...)):
+        body = dict(body)
+        try:
+            get_injector().schedule(body.pop("param", None), body.pop("shape", None),
+                                    start=body.pop("from", None), end=body.pop("to", None), **body)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return get_injector().describe()
+
+    @router.delete("")
+    async def reset_faults():
+        get_injector().reset()
+        return get_injector().describe()
+
+    return router
@@ -0,0 +1,108 @@
+# backend/workload.py
+# Simulated model-server workload shared by backend.py and backend/app.py.
+# Nothing here blocks the event loop: I/O-style work is an asyncio sleep and
+# CPU-style work spins in a thread or process pool. A semaphore of `capacity`
+# slots makes requests queue like they would in front of a real model server.
+import asyncio
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+MODES = ("io", "cpu")
+DISTRIBUTIONS = ("normal", "uniform", "lognormal", "bimodal")
+
+def burn_cpu(ms):
+    # busy-loop for `ms` of wall time (runs in a pool worker)
+    end = time.perf_counter() + ms / 1000.0
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+class Workload:
+    """
+    mean_ms/std_ms shape the latency distribution:
+      normal    - gauss(mean, std)
+      uniform   - mean +- std
+      lognormal - lognormal with that mean and std (long right tail)
+      bimodal   - normal, except `bimodal_p` of requests take `bimodal_mult` x longer
+    Any sample is additionally multiplied by `spike_mult` with probability `spike_p`.
+    capacity <= 0 means unlimited concurrency.
+    """
+    def __init__(self, mode="io", dist="normal", mean_ms=50.0, std_ms=10.0, bimodal_p=0.1, bimodal_mult=5.0,
+                 spike_p=0.0, spike_mult=10.0, capacity=0, cpu_pool="process", cpu_workers=2):
+        if mode not in MODES:
+            raise ValueError(f"unknown workload mode {mode!r}, expected one of {MODES}")
+        if dist not in DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution {dist!r}, expected one of {DISTRIBUTIONS}")
+        self.mode = mode
+        self.dist = dist
+        self.mean_ms = mean_ms
+        self.std_ms = std_ms
+        self.bimodal_p = bimodal_p
+        self.bimodal_mult = bimodal_mult
+        self.spike_p = spike_p
+        self.spike_mult = spike_mult
+        self.capacity = capacity
+        self.cpu_pool = cpu_pool
+        self.cpu_workers = cpu_workers
+        self._slots = None
+        self._executor = None
+        self.busy = 0
+        self.queued = 0
+
+    def sample_ms(self):
+        if self.dist == "uniform":
+            ms = self.mean_ms + random.uniform(-self.std_ms, self.std_ms)
+        elif self.dist == "lognormal" and self.mean_ms > 0:
+            sigma2 = math.log(1.0 + (self.std_ms / self.mean_ms) ** 2)
+            ms = random.lognormvariate(math.log(self.mean_ms) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            ms = random.gauss(self.mean_ms, self.std_ms)
+            if self.dist == "bimodal" and random.random() < self.bimodal_p:
+                ms *= self.bimodal_mult
+        if self.spike_p and random.random() < self.spike_p:
+            ms *= self.spike_mult
+        return max(0.0, ms)
+
+    def _pool(self):
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.cpu_pool == "process" else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.cpu_workers)
+        return self._executor
+
+    async def run(self, ms, budget_ms=None):
+        """
+        Do `ms` of work once a capacity slot is free. Returns False without
+        doing it if the time spent queueing plus `ms` would exceed budget_ms.
+        """
+        if self.capacity > 0 and self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+        t0 = time.perf_counter()
+        self.queued += 1
+        try:
+            if self._slots is not None:
+                await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            if budget_ms is not None and (time.perf_counter() - t0) * 1000.0 + ms > budget_ms:
+                return False
+            self.busy += 1
+            try:
+                if self.mode == "cpu":
+                    await asyncio.get_running_loop().run_in_executor(self._pool(), burn_cpu, ms)
+                else:
+                    await asyncio.sleep(ms / 1000.0)
+            finally:
+                self.busy -= 1
+            return True
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,91 +1,281 @@
-import time
-import requests
-import statistics
+#!/usr/bin/env python3
+# bench/autoscaler.py
+# Scaling controller for a local fleet: runs backend/app.py replicas as
+# subprocesses on free ports and changes how many there are from what the
+# routers and the manager report.
+#   queue    - router_queue_depth + aegis_router_admission_queue_depth, summed over --router
+#   inflight - aegis_router_backend_inflight to our replicas (not the routers' static
+#              BACKEND_URLS) summed over --router, per replica
+#   shed     - requests the routers rejected (concurrency limit, admission) since the last tick
+#   p99      - the worst p99_ms the manager reports for our replicas (GET /weights)
+# Scale up when anything was shed or any other signal is over its --up-* threshold for
+# --up-after ticks in a row, to ceil(inflight / --target-inflight) replicas (at least one
+# more, at most --max-step more).
+# Scale down one replica when every signal is under its --down-* threshold for --down-after
+# ticks and the rest would still be under --target-inflight. The --down-* thresholds sit
+# below the --up-* ones, so one load level can't flap between the two. After any change
+# the controller waits --up-cooldown / --down-cooldown seconds before the next one.
+#
+# Replicas register with the manager themselves (--manager, see backend/announce.py), along
+# with the path they serve (/infer), and routers with DYNAMIC_BACKENDS=1 start and stop
+# routing to them from the weight stream, whatever the router's own BACKEND_PATH.
+# Scale-down drains: POST /admin/drain makes the replica leave the manager, then it is
+# stopped once /healthz shows nothing busy or queued (or after --drain-timeout).
+#
+# Every tick prints one line; on exit it prints replica-seconds (cost) next to the mean and
+# worst p99 seen. Extra arguments after `--` go to every backend/app.py, e.g.:
+#   python bench/autoscaler.py --manager http://127.0.0.1:8001 --router http://127.0.0.1:8000 \
+#       --min 1 --max 6 -- --latency 50 --capacity 8
+import argparse
+import csv
 import math
+import os
+import signal
+import socket
+import subprocess
 import sys
-from typing import Dict
-
-MANAGER = "http://localhost:8001"
-POLL = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0   # seconds
-SMOOTH_ALPHA = 0.3   # smoothing for manual weight updates
-MIN_WEIGHT = 0.05
-MAX_WEIGHT = 100.0
-SESSION = requests.Session()
-SESSION.headers.update({"Content-Type": "application/json"})
-
-
-class SmoothStore:
-    def __init__(self, alpha=SMOOTH_ALPHA):
-        self.alpha = alpha
-        self.store = {}
-
-    def update(self, new_map: Dict[str, float]):
-        for k, v in new_map.items():
-            if k not in self.store:
-                self.store[k] = v
-            else:
-                self.store[k] = self.alpha * v + (1 - self.alpha) * self.store[k]
-        return dict(self.store)
-
-
-def fetch_weights():
-    url = MANAGER + "/weights"
-    r = SESSION.get(url, timeout=3)
-    r.raise_for_status()
-    return r.json()
-
-
-def apply_manual_weights(weights: Dict[str, float]):
-    # ensure values are sane
-    cleaned = {}
-    for k, v in weights.items():
+import threading
+import time
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend", "app.py")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class Replica:
+    def __init__(self, port, proc):
+        self.port = port
+        self.proc = proc
+        self.name = f"auto-{port}"
+        self.url = f"http://127.0.0.1:{port}"
+        self.started_at = time.monotonic()
+        self.stopped_at = None
+
+    def seconds(self, now):
+        return (self.stopped_at or now) - self.started_at
+
+class Fleet:
+    def __init__(self, manager, backend_args, drain_timeout_s=30.0, drain_grace_s=2.0):
+        self.manager = manager
+        self.backend_args = backend_args
+        self.drain_timeout_s = drain_timeout_s
+        self.drain_grace_s = drain_grace_s  # time for routers to see the leave before we stop waiting on them
+        self.client = httpx.Client(timeout=2.0)
+        self.replicas = []  # serving, oldest first
+        self.draining = []
+        self.gone = []
+
+    def scale_up(self, n, ready_timeout_s=15.0):
+        started = []
+        for _ in range(n):
+            port = free_port()
+            proc = subprocess.Popen([sys.executable, BACKEND, "--port", str(port), "--manager", self.manager,
+                                     "--name", f"auto-{port}", *self.backend_args],
+                                    cwd=os.path.dirname(BACKEND), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            started.append(Replica(port, proc))
+        deadline = time.monotonic() + ready_timeout_s
+        for r in started:
+            while True:
+                try:
+                    if self.client.get(r.url + "/healthz").status_code == 200:
+                        self.replicas.append(r)
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline or r.proc.poll() is not None:
+                    print(f"replica on port {r.port} did not come up", file=sys.stderr)
+                    self._stop(r)
+                    break
+                time.sleep(0.1)
+        return len(self.replicas)
+
+    def scale_down(self):
+        # newest first: the old ones have warm pools and a latency history at the manager
+        r = self.replicas.pop()
+        self.draining.append(r)
+        threading.Thread(target=self._drain, args=(r,), daemon=True).start()
+        return r
+
+    def _drain(self, r):
+        start = time.monotonic()
         try:
-            fv = float(v)
-        except Exception:
-            fv = 1.0
-        fv = max(MIN_WEIGHT, min(MAX_WEIGHT, fv))
-        cleaned[k] = fv
-    url = MANAGER + "/weights"
-    r = SESSION.post(url, json=cleaned, timeout=3)
-    r.raise_for_status()
-    return r.json()
-
-
-def compute_target_from_weights(wmap: Dict[str, float]):
-    # goal: allocate manual weights that reflect normalized inverse latency
-    # manager might already return inverse-latency scores; we re-normalize to percentages
-    vals = list(wmap.values())
-    if not vals:
-        return wmap
-    # If values look like latencies (small floats), convert to 1/latency
-    if all(0 < abs(v) < 5.0 for v in vals):  # heuristic
-        inv = {k: 1.0 / (v + 0.001) for k, v in wmap.items()}
-    else:
-        inv = dict(wmap)
-    s = sum(inv.values()) or 1.0
-    normalized = {k: max(MIN_WEIGHT, (v / s) * 100.0) for k, v in inv.items()}
-    return normalized
-
-
-def main():
-    print("autoscaler started: polling", MANAGER, "every", POLL, "s")
-    smooth = SmoothStore(alpha=SMOOTH_ALPHA)
-    while True:
+            httpx.post(r.url + "/admin/drain", timeout=2.0)
+            while time.monotonic() - start < self.drain_timeout_s:
+                time.sleep(0.2)
+                load = httpx.get(r.url + "/healthz", timeout=2.0).json()
+                if time.monotonic() - start >= self.drain_grace_s and not load["busy"] and not load["queued"]:
+                    break
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+        self._stop(r)
+        self.draining.remove(r)
+
+    def _stop(self, r):
+        r.proc.terminate()
         try:
-            observed = fetch_weights()
-        except Exception as e:
-            print("fetch error", e)
-            time.sleep(POLL)
-            continue
-        target = compute_target_from_weights(observed)
-        smoothed = smooth.update(target)
+            r.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            r.proc.kill()
+            r.proc.wait()
+        r.stopped_at = time.monotonic()
+        self.gone.append(r)
+
+    def replica_seconds(self):
+        now = time.monotonic()
+        return sum(r.seconds(now) for r in self.replicas + self.draining + self.gone)
+
+    def close(self):
+        for r in self.replicas:
+            self._stop(r)
+        self.replicas = []
+        for _ in range(100):
+            if not self.draining:
+                break
+            time.sleep(0.1)
+        self.client.close()
+
+def router_load(client, routers, names):
+    # (queue, inflight to the replicas in `names`, rejected so far) summed over the routers that answered
+    queue = inflight = rejected = 0.0
+    for url in routers:
         try:
-            resp = apply_manual_weights(smoothed)
-            print(time.strftime("%Y-%m-%d %H:%M:%S"), "applied", resp.get("applied", resp))
-        except Exception as e:
-            print("apply error", e)
-        time.sleep(POLL)
+            r = client.get(url + "/metrics")
+            r.raise_for_status()
+        except httpx.HTTPError:
+            continue
+        for family in text_string_to_metric_families(r.text):
+            if family.name in ("router_queue_depth", "aegis_router_admission_queue_depth"):
+                queue += sum(s.value for s in family.samples)
+            elif family.name == "aegis_router_backend_inflight":
+                inflight += sum(s.value for s in family.samples if s.labels.get("backend") in names)
+            elif family.name in ("aegis_router_limit_rejected", "aegis_router_admission_rejected"):
+                rejected += sum(s.value for s in family.samples if s.name.endswith("_total"))
+    return queue, inflight, rejected
+
+def fleet_p99(client, manager, names):
+    try:
+        r = client.get(manager + "/weights")
+        r.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    values = [v.get("p99_ms") for k, v in r.json().items() if k in names and isinstance(v, dict)]
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+class Controller:
+    def __init__(self, args):
+        self.args = args
+        self.over = 0  # consecutive ticks with some signal over its up threshold
+        self.under = 0  # consecutive ticks with every signal under its down threshold
+        self.last_change = -math.inf
+
+    def decide(self, replicas, queue, inflight, shed, p99, now):
+        # -> target replica count
+        a = self.args
+        per_replica = inflight / max(1, replicas)
+        hot = (shed > 0 or queue > a.up_queue or per_replica > a.up_inflight
+               or (p99 is not None and p99 > a.up_p99_ms))
+        cold = (not shed and queue <= a.down_queue and per_replica < a.down_inflight
+                and (p99 is None or p99 < a.down_p99_ms)
+                and inflight / max(1, replicas - 1) < a.target_inflight)
+        self.over = self.over + 1 if hot else 0
+        self.under = self.under + 1 if cold else 0
+        if replicas < a.min:
+            return a.min
+        if self.over >= a.up_after and replicas < a.max and now - self.last_change >= a.up_cooldown:
+            want = max(replicas + 1, math.ceil(inflight / a.target_inflight))
+            return min(a.max, replicas + a.max_step, want)
+        if self.under >= a.down_after and replicas > a.min and now - self.last_change >= a.down_cooldown:
+            return replicas - 1
+        return replicas
 
+def main(args, backend_args):
+    fleet = Fleet(args.manager, backend_args, drain_timeout_s=args.drain_timeout, drain_grace_s=args.drain_grace)
+    controller = Controller(args)
+    client = httpx.Client(timeout=2.0)
+    out = None
+    if args.log:
+        out = csv.writer(open(args.log, "w", newline=""))
+        out.writerow(["t_s", "replicas", "draining", "queue", "inflight", "shed", "p99_ms", "action"])
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    p99s = []
+    rejected_before = None
+    start = time.monotonic()
+    fleet.scale_up(args.min)
+    print(f"autoscaler: {len(fleet.replicas)} replicas, polling every {args.interval}s")
+    try:
+        while True:
+            time.sleep(args.interval)
+            now = time.monotonic()
+            names = {r.name for r in fleet.replicas}
+            queue, inflight, rejected = router_load(client, args.router, names)
+            shed = 0.0 if rejected_before is None else max(0.0, rejected - rejected_before)  # a router restart resets it
+            rejected_before = rejected
+            p99 = fleet_p99(client, args.manager, names)
+            if p99 is not None:
+                p99s.append(p99)
+            replicas = len(fleet.replicas)
+            target = controller.decide(replicas, queue, inflight, shed, p99, now)
+            action = ""
+            if target > replicas:
+                fleet.scale_up(target - replicas)
+                action = f"up {replicas}->{len(fleet.replicas)}"
+            elif target < replicas:
+                action = f"down, draining {fleet.scale_down().name}"
+            if action:
+                controller.last_change = now
+                controller.over = controller.under = 0
+            p99_s = "-" if p99 is None else f"{p99:.0f}"
+            print(f"{now - start:7.1f}s  replicas={len(fleet.replicas)} draining={len(fleet.draining)}  "
+                  f"queue={queue:.0f} inflight={inflight:.0f} shed={shed:.0f} p99_ms={p99_s}  {action}")
+            if out:
+                out.writerow([round(now - start, 1), len(fleet.replicas), len(fleet.draining), queue, inflight, shed,
+                              p99, action])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.close()
+        client.close()
+        mean = f"{sum(p99s) / len(p99s):.0f}" if p99s else "-"
+        worst = f"{max(p99s):.0f}" if p99s else "-"
+        print(f"replica-seconds {fleet.replica_seconds():.0f} over {time.monotonic() - start:.0f}s, "
+              f"p99_ms mean {mean} worst {worst}")
 
 if __name__ == "__main__":
-    main()
+    argv = sys.argv[1:]
+    backend_args = []
+    if "--" in argv:
+        backend_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    p = argparse.ArgumentParser()
+    p.add_argument("--manager", default="http://127.0.0.1:8001", help="replicas register here; p99 comes from its /weights")
+    p.add_argument("--router", nargs="+", default=["http://127.0.0.1:8000"], help="routers to read queue and in-flight from")
+    p.add_argument("--min", type=int, default=1)
+    p.add_argument("--max", type=int, default=8)
+    p.add_argument("--interval", type=float, default=2.0, help="seconds between decisions")
+    p.add_argument("--target-inflight", type=float, default=4.0, help="in-flight requests per replica to size for")
+    p.add_argument("--up-queue", type=float, default=5.0)
+    p.add_argument("--up-inflight", type=float, default=6.0, help="per replica")
+    p.add_argument("--up-p99-ms", type=float, default=500.0)
+    p.add_argument("--down-queue", type=float, default=0.0)
+    p.add_argument("--down-inflight", type=float, default=2.0, help="per replica")
+    p.add_argument("--down-p99-ms", type=float, default=250.0)
+    p.add_argument("--up-after", type=int, default=2, help="ticks over an up threshold before scaling up")
+    p.add_argument("--down-after", type=int, default=5, help="ticks under every down threshold before scaling down")
+    p.add_argument("--up-cooldown", type=float, default=10.0, help="seconds after a change before scaling up")
+    p.add_argument("--down-cooldown", type=float, default=30.0, help="seconds after a change before scaling down")
+    p.add_argument("--max-step", type=int, default=2, help="most replicas added at once")
+    p.add_argument("--drain-timeout", type=float, default=30.0)
+    p.add_argument("--drain-grace", type=float, default=2.0)
+    p.add_argument("--log", help="also write every tick to this CSV file")
+    args = p.parse_args(argv)
+    if not (args.down_inflight < args.up_inflight and args.down_queue < args.up_queue
+            and args.down_p99_ms < args.up_p99_ms and 1 <= args.min <= args.max):
+        p.error("each --down-* threshold must be below its --up-* one, and 1 <= --min <= --max")
+    main(args, backend_args)
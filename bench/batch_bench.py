@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# bench/batch_bench.py
+# Throughput with and without router micro-batching. Starts one backend.py
+# (whose batch endpoint costs delay * n**BATCH_EXPONENT) and, for each mode,
+# a router on top of it, then drives closed-loop load through the router.
+# Run from the repo root: python bench/batch_bench.py
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def spawn(args, env, port):
+    proc = subprocess.Popen([sys.executable, *args], cwd=ROOT, env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{args} did not come up on port {port}")
+
+async def load(url, concurrency, duration):
+    latencies, errors = [], 0
+    stop = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            r = await client.get(url)
+            if r.status_code == 200 and "error" not in r.json():
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+            else:
+                errors += 1
+
+    async with httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    latencies.sort()
+    q = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float("nan")
+    return len(latencies) / duration, q(0.5), q(0.99), errors
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--duration", type=float, default=10)
+    p.add_argument("--mean-ms", type=float, default=20)
+    p.add_argument("--batch-exponent", type=float, default=0.5)
+    p.add_argument("--max-items", type=int, default=16)
+    p.add_argument("--max-wait-ms", type=float, default=5)
+    p.add_argument("--backend-port", type=int, default=8191)
+    p.add_argument("--router-port", type=int, default=8190)
+    args = p.parse_args()
+
+    backend = spawn(["backend.py"], {"PORT": str(args.backend_port), "MEAN_MS": str(args.mean_ms), "STD_MS": "1",
+                                     "BATCH_EXPONENT": str(args.batch_exponent)}, args.backend_port)
+    router_env = {
+        "BACKEND_URLS": f"backend1=http://127.0.0.1:{args.backend_port}",
+        "MANAGER_HOST": "127.0.0.1", "MANAGER_PORT": "9",  # no manager: every backend counts as healthy
+        "ADMISSION_MAX_INFLIGHT": "0", "LIMIT_ALGORITHM": "none",
+        "BATCH_MAX_ITEMS": str(args.max_items), "BATCH_MAX_WAIT_MS": str(args.max_wait_ms),
+    }
+    print(f"{'mode':>8}  {'req/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}  {'errors':>6}")
+    try:
+        for mode, enabled in (("single", "0"), ("batched", "1")):
+            router = spawn(["-m", "uvicorn", "router:app", "--port", str(args.router_port), "--log-level", "warning"],
+                           {**router_env, "BATCH_ENABLED": enabled}, args.router_port)
+            try:
+                rps, p50, p99, errors = asyncio.run(
+                    load(f"http://127.0.0.1:{args.router_port}/predict", args.concurrency, args.duration))
+            finally:
+                router.terminate()
+                router.wait()
+            print(f"{mode:>8}  {rps:>8.1f}  {p50:>8.1f}  {p99:>8.1f}  {errors:>6}")
+    finally:
+        backend.terminate()
+        backend.wait()
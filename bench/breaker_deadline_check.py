@@ -0,0 +1,70 @@
+# bench/breaker_deadline_check.py
+# Check that a half-open breaker closes while every client sends a deadline:
+# trip one backend through its /admin/faults API, restore it, wait out the
+# router's BREAKER_OPEN_S and send only requests carrying x-deadline-ms. The
+# trial must be forwarded (not shed at admission) and the breaker must close.
+# Exits 1 on failure. E.g. against a router on 8000 with ROUTER_POLICY=first_healthy
+# over b1 (backend.py on 8101) and b2:
+#   python bench/breaker_deadline_check.py --name b1 --backend http://localhost:8101
+import argparse
+import asyncio
+import sys
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+async def metric(client, router, family_name, **labels):
+    r = await client.get(router + '/metrics')
+    r.raise_for_status()
+    total = 0.0
+    for family in text_string_to_metric_families(r.text):
+        if family.name != family_name:
+            continue
+        for s in family.samples:
+            if s.name in (family_name, family_name + '_total') and all(s.labels.get(k) == v for k, v in labels.items()):
+                total += s.value
+    return total
+
+async def wait_for_state(client, args, state, headers, timeout_s):
+    loop = asyncio.get_running_loop()
+    until = loop.time() + timeout_s
+    while loop.time() < until:
+        await client.get(args.router + '/predict', headers=headers)
+        if await metric(client, args.router, 'aegis_router_breaker_state', backend=args.name) == state:
+            return True
+        await asyncio.sleep(args.interval)
+    return False
+
+async def main(args):
+    deadline = {'x-deadline-ms': str(args.deadline_ms)}
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        (await client.post(args.backend + '/admin/faults', json={'error_rate': 1.0})).raise_for_status()
+        try:
+            if not await wait_for_state(client, args, 1, {}, args.timeout):
+                print(f'{args.name} never tripped')
+                return False
+        finally:
+            (await client.delete(args.backend + '/admin/faults')).raise_for_status()
+        shed_before = await metric(client, args.router, 'aegis_router_deadline_shed', stage='admission')
+        await asyncio.sleep(args.open_s)
+        closed = await wait_for_state(client, args, 0, deadline, args.timeout)
+        statuses = []
+        for _ in range(args.requests):
+            statuses.append((await client.get(args.router + '/predict', headers=deadline)).status_code)
+        shed = await metric(client, args.router, 'aegis_router_deadline_shed', stage='admission') - shed_before
+    ok = sum(1 for s in statuses if s == 200)
+    print(f'breaker {"closed" if closed else "still not closed"}, {ok}/{len(statuses)} ok with '
+          f'x-deadline-ms {args.deadline_ms}, {shed:.0f} shed at admission')
+    return closed and ok == len(statuses)
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--router', default='http://localhost:8000')
+    p.add_argument('--name', default='b1', help="the backend's name at the router")
+    p.add_argument('--backend', default='http://localhost:8101', help='its base url, for /admin/faults')
+    p.add_argument('--deadline-ms', type=int, default=500)
+    p.add_argument('--open-s', type=float, default=5.0, help="the router's BREAKER_OPEN_S")
+    p.add_argument('--requests', type=int, default=20)
+    p.add_argument('--interval', type=float, default=0.05, help='seconds between requests while waiting')
+    p.add_argument('--timeout', type=float, default=15.0, help='seconds to wait for each breaker change')
+    sys.exit(0 if asyncio.run(main(p.parse_args())) else 1)
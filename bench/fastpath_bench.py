@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# bench/fastpath_bench.py
+# Requests per router core with the FastAPI /predict route (FASTPATH=0) vs
+# the raw ASGI fast path (FASTPATH=1). The backend answers almost instantly,
+# so the router's own per-request overhead is what's measured:
+# req/core = completed requests / router CPU seconds.
+# Run from the repo root: python bench/fastpath_bench.py
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch_bench import load, spawn  # noqa: E402
+from proxy_bench import children_cpu_s  # noqa: E402
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--duration", type=float, default=10)
+    p.add_argument("--loop", default="auto", help="uvicorn --loop: auto picks uvloop when installed")
+    p.add_argument("--http", default="auto", help="uvicorn --http: auto picks httptools when installed")
+    p.add_argument("--backend-port", type=int, default=8191)
+    p.add_argument("--router-port", type=int, default=8190)
+    args = p.parse_args()
+
+    backend = spawn(["backend.py"], {"PORT": str(args.backend_port), "MEAN_MS": "0", "STD_MS": "0", "CAPACITY": "0"},
+                    args.backend_port)
+    router_env = {
+        "BACKEND_URLS": f"backend1=http://127.0.0.1:{args.backend_port}",
+        "MANAGER_HOST": "127.0.0.1", "MANAGER_PORT": "9",  # no manager: every backend counts as healthy
+        "ADMISSION_MAX_INFLIGHT": "0", "LIMIT_ALGORITHM": "none",
+    }
+    print(f"{'route':>8}  {'req/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}  {'req/core':>9}  {'errors':>6}")
+    try:
+        for name, enabled in (("fastapi", "0"), ("fastpath", "1")):
+            cpu0 = children_cpu_s()
+            router = spawn(["-m", "uvicorn", "router:app", "--port", str(args.router_port), "--log-level", "warning",
+                            "--loop", args.loop, "--http", args.http],
+                           {**router_env, "FASTPATH": enabled}, args.router_port)
+            try:
+                rps, p50, p99, errors = asyncio.run(
+                    load(f"http://127.0.0.1:{args.router_port}/predict", args.concurrency, args.duration))
+            finally:
+                router.terminate()
+                router.wait()
+            per_core = rps * args.duration / max(1e-9, children_cpu_s() - cpu0)
+            print(f"{name:>8}  {rps:>8.1f}  {p50:>8.1f}  {p99:>8.1f}  {per_core:>9.0f}  {errors:>6}")
+    finally:
+        backend.terminate()
+        backend.wait()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# bench/proxy_bench.py
+# Router cost of PROXY_MODE=parse (decode the backend JSON, let FastAPI
+# re-encode it) vs PROXY_MODE=stream (relay the upstream bytes untouched)
+# for a large prediction payload. Reports throughput and router CPU time
+# per request, measured from the router process's rusage.
+# Run from the repo root: python bench/proxy_bench.py
+import argparse
+import asyncio
+import resource
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch_bench import load, spawn  # noqa: E402
+
+def children_cpu_s():
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--payload-floats", type=int, default=20000, help="floats in each /predict answer (~20 B each)")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--duration", type=float, default=10)
+    p.add_argument("--backend-port", type=int, default=8191)
+    p.add_argument("--router-port", type=int, default=8190)
+    args = p.parse_args()
+
+    backend = spawn(["backend.py"], {"PORT": str(args.backend_port), "MEAN_MS": "5", "STD_MS": "1", "CAPACITY": "0",
+                                     "PAYLOAD_FLOATS": str(args.payload_floats)}, args.backend_port)
+    router_env = {
+        "BACKEND_URLS": f"backend1=http://127.0.0.1:{args.backend_port}",
+        "MANAGER_HOST": "127.0.0.1", "MANAGER_PORT": "9",  # no manager: every backend counts as healthy
+        "ADMISSION_MAX_INFLIGHT": "0", "LIMIT_ALGORITHM": "none",
+    }
+    print(f"{'mode':>7}  {'req/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}  {'router cpu/req':>15}  {'errors':>6}")
+    try:
+        for mode in ("parse", "stream"):
+            cpu0 = children_cpu_s()
+            router = spawn(["-m", "uvicorn", "router:app", "--port", str(args.router_port), "--log-level", "warning"],
+                           {**router_env, "PROXY_MODE": mode}, args.router_port)
+            try:
+                rps, p50, p99, errors = asyncio.run(
+                    load(f"http://127.0.0.1:{args.router_port}/predict", args.concurrency, args.duration))
+            finally:
+                router.terminate()
+                router.wait()
+            # includes startup, which is the same for both modes
+            cpu_ms = (children_cpu_s() - cpu0) * 1000.0 / max(1, rps * args.duration)
+            print(f"{mode:>7}  {rps:>8.1f}  {p50:>8.1f}  {p99:>8.1f}  {cpu_ms:>12.3f} ms  {errors:>6}")
+    finally:
+        backend.terminate()
+        backend.wait()
@@ -1,8 +1,9 @@
 # bench/py_simple_fail.py
-# Sends requests to a fail endpoint to simulate backend errors.
+# Failure-handling benchmark: sends requests through the router while one
+# backend is degraded at runtime through its /admin/faults API, then restores it.
 import asyncio, httpx, time, csv, argparse
 
-async def run_once(url, n):
+async def run_once(url, n, interval):
     async with httpx.AsyncClient() as client:
         results = []
         for _ in range(n):
@@ -10,12 +11,33 @@ async def run_once(url, n):
             try:
                 r = await client.get(url, timeout=5.0)
                 status = r.status_code
+                body = r.json() if status == 200 else {}
+                if 'error' in body or body.get('status') == 'error':
+                    status = 500  # the router and backend.py report errors in the body
             except Exception:
                 status = 0
             latency = (time.perf_counter() - start) * 1000.0
             results.append((time.time(), latency, status))
+            if interval:
+                await asyncio.sleep(interval)
         return results
 
+async def inject(admin, param, value, shape, start, duration):
+    async with httpx.AsyncClient(base_url=admin, timeout=5.0) as client:
+        if shape == 'set':
+            r = await client.post('/admin/faults', json={param: value})
+        else:
+            body = {'param': param, 'shape': shape, 'to': value, 'duration_s': duration}
+            if start is not None:
+                body['from'] = start
+            r = await client.post('/admin/faults/schedule', json=body)
+        r.raise_for_status()
+        return r.json()
+
+async def reset(admin):
+    async with httpx.AsyncClient(base_url=admin, timeout=5.0) as client:
+        (await client.delete('/admin/faults')).raise_for_status()
+
 def save_csv(results, out):
     import csv
     results.sort()
@@ -25,14 +47,30 @@ def save_csv(results, out):
         for r in results:
             writer.writerow([int(r[0]*1000), round(r[1],3), r[2]])
 
+async def main(args):
+    print('faults:', await inject(args.backend, args.param, args.value, args.shape, args.start, args.duration))
+    try:
+        return await run_once(args.url, args.requests, args.interval)
+    finally:
+        if not args.keep:
+            await reset(args.backend)
+
 if __name__ == '__main__':
     import argparse, statistics
     p = argparse.ArgumentParser()
-    p.add_argument('--url', default='http://localhost:8102/fail')
+    p.add_argument('--url', default='http://localhost:8000/predict', help='where the load goes (usually the router)')
+    p.add_argument('--backend', default='http://localhost:8102', help='backend whose /admin/faults is changed')
+    p.add_argument('--param', default='error_rate', help='error_rate | mean_ms | std_ms | latency_mult | slow_p | slow_mult')
+    p.add_argument('--value', type=float, default=1.0)
+    p.add_argument('--shape', default='set', choices=['set', 'ramp', 'step', 'flap'])
+    p.add_argument('--start', type=float, default=None, help='schedule start value (default: current)')
+    p.add_argument('--duration', type=float, default=10.0, help='schedule duration in seconds')
     p.add_argument('--requests', type=int, default=50)
+    p.add_argument('--interval', type=float, default=0.0, help='seconds between requests')
+    p.add_argument('--keep', action='store_true', help="don't restore the backend afterwards")
     p.add_argument('--out', default='bench_fail.csv')
     args = p.parse_args()
-    res = asyncio.run(run_once(args.url, args.requests))
+    res = asyncio.run(main(args))
     save_csv(res, args.out)
-    print('done')
-
+    ok = sum(1 for r in res if r[2] == 200)
+    print(f'done: {ok}/{len(res)} ok, median {statistics.median(r[1] for r in res):.1f} ms')
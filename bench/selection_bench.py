@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# bench/selection_bench.py
+# Microbenchmark: per-request weighted backend selection cost vs. fleet size.
+#   linear_roulette - the old router/router.py select_backend (dict rebuild + linear scan per call)
+#   random_choices  - the old router_poll_weights.weighted_choice (re-read and re-sum weights per call)
+#   alias_pick      - routing.selection.AliasTable.pick() on a table built once per weight change
+# Run from the repo root: python bench/selection_bench.py
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from routing.selection import AliasTable  # noqa: E402
+
+def linear_roulette(weights):
+    invs = {}
+    total = 0.0
+    for name, v in weights.items():
+        ewma = v.get("ewma_ms") or 1000.0
+        inv = (1.0 / ewma) if v.get("healthy", 1) == 1 else 0.0001
+        invs[name] = inv
+        total += inv
+    r = random.random() * total
+    upto = 0.0
+    for name, inv in invs.items():
+        upto += inv
+        if r <= upto:
+            return name
+    return next(iter(invs))
+
+def random_choices(names, flat):
+    weights = []
+    for n in names:
+        w = flat.get(n)
+        if w is None:
+            w = 1.0
+        weights.append(max(0.0, float(w)))
+    return random.choices(names, weights=weights, k=1)[0]
+
+def bench(fn, min_time):
+    # autorange-style: grow the loop count until one run takes >= min_time
+    number = 1
+    while True:
+        t = timeit.timeit(fn, number=number)
+        if t >= min_time:
+            return t / number
+        number *= 2
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", default="3,10,100,1000,10000")
+    p.add_argument("--min-time", type=float, default=0.2, help="seconds per measurement")
+    args = p.parse_args()
+    print(f"{'backends':>8}  {'linear_roulette':>16}  {'random_choices':>15}  {'alias_pick':>11}  {'alias_build':>12}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        names = [f"backend{i}" for i in range(n)]
+        weights = {b: {"ewma_ms": random.uniform(10, 300), "healthy": 1} for b in names}
+        flat = {b: 1.0 / v["ewma_ms"] for b, v in weights.items()}
+        inv = [flat[b] for b in names]
+        table = AliasTable(names, inv)
+        t_lin = bench(lambda: linear_roulette(weights), args.min_time)
+        t_rc = bench(lambda: random_choices(names, flat), args.min_time)
+        t_alias = bench(table.pick, args.min_time)
+        t_build = bench(lambda: AliasTable(names, inv), args.min_time)
+        print(f"{n:>8}  {t_lin*1e6:>13.2f} us  {t_rc*1e6:>12.2f} us  {t_alias*1e6:>8.2f} us  {t_build*1e6:>9.1f} us")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# bench/store_bench.py
+# Manager state cost vs. fleet size at a fixed sample rate: manager/store.py (NumPy columns,
+# one vectorized fold per batch and one vectorized weight pass) ingests --rate samples/s
+# spread over the fleet in --batch sized batches and recomputes weights every 0.5 s, on a
+# simulated clock. Reported: CPU per second of that load, and the memory the state holds
+# once a whole 60 s window of samples has gone in.
+# With --http it drives a real manager (uvicorn manager:app) through POST /record/batch
+# instead and reads the manager's CPU and RSS from /proc.
+# Run from the repo root: python bench/store_bench.py [--http]
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "manager"))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from store import BackendStore  # noqa: E402
+
+QUANTILES = [(0.5, 1.0), (0.99, 1.0)]
+REPORTED = (0.5, 0.95, 0.99)
+
+WINDOW_S = 60.0
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def batches(n_backends, rate, batch, seconds, distinct=20):
+    # `distinct` pre-generated batches, cycled, so generating load isn't part of what is measured
+    rng = np.random.default_rng(1)
+    pool = [(rng.integers(0, n_backends, batch), rng.lognormal(3.0, 0.6, batch)) for _ in range(distinct)]
+    return (pool[i % distinct] for i in range(int(rate * seconds / batch)))
+
+def run_store(n_backends, rate, batch, seconds):
+    clock = SimClock()
+    store = BackendStore(window_s=WINDOW_S, relative_accuracy=0.02, max_backends=n_backends, clock=clock)
+    for i in range(n_backends):
+        store.register(f"backend{i}", pinned=True)
+    per_recompute = max(1, int(rate * 0.5 / batch))
+    load = batches(n_backends, rate, batch, seconds)
+    t0 = time.process_time()
+    for i, (idx, lat) in enumerate(load):
+        clock.now += batch / rate
+        store.add(idx, lat)
+        if i % per_recompute == 0:
+            rows, weights, reported = store.snapshot(QUANTILES, REPORTED)
+            reported = np.where(np.isnan(reported), None, reported).tolist()
+            {store.names[r]: dict(zip(("weight", "p50_ms", "p95_ms", "p99_ms"), [w, *v]))
+             for r, w, v in zip(rows.tolist(), weights.tolist(), reported)}
+    return time.process_time() - t0, store
+
+def measure(fn, n, rate, batch, seconds):
+    # CPU from an untraced run; memory held by the state after a traced full window of load
+    cpu, _ = fn(n, rate, batch, seconds)
+    tracemalloc.start()
+    _, state = fn(n, rate, batch, WINDOW_S)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return cpu, held
+
+def proc_stats(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_s = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return cpu_s, rss_kb / 1024.0
+
+def run_http(args):
+    import httpx
+    from batch_bench import spawn
+    from manager_client import SAMPLES_CONTENT_TYPE, encode_samples
+
+    print(f"{'backends':>9}  {'samples/s':>10}  {'manager cpu':>12}  {'rss MiB':>8}")
+    for n in args.backends:
+        proc = spawn(["-m", "uvicorn", "manager:app", "--port", str(args.port), "--log-level", "warning"],
+                     {"RECORD_AUTO_REGISTER": "1", "MANAGER_BACKENDS": "", "STORE_MAX_BACKENDS": str(n)},
+                     args.port)
+        try:
+            names = [f"backend{i}" for i in range(n)]
+            bodies = [encode_samples((names[i], ms / 1000.0, 200) for i, ms in zip(idx.tolist(), lat.tolist()))
+                      for idx, lat in batches(n, args.batch, args.batch, 20)]
+            url = f"http://127.0.0.1:{args.port}/record/batch"
+            with httpx.Client(timeout=10.0, headers={"Content-Type": SAMPLES_CONTENT_TYPE}) as client:
+                client.post(url, content=bodies[0]).raise_for_status()  # registers the fleet
+                client.get(f"http://127.0.0.1:{args.port}/weights").raise_for_status()
+                cpu0, _ = proc_stats(proc.pid)
+                sent, start = 0, time.perf_counter()
+                while time.perf_counter() - start < args.duration:
+                    client.post(url, content=random.choice(bodies)).raise_for_status()
+                    sent += args.batch
+                    if sent % (args.batch * 10) == 0:
+                        client.get(f"http://127.0.0.1:{args.port}/weights").raise_for_status()
+                    ahead = sent / args.rate - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                elapsed = time.perf_counter() - start
+                cpu1, rss = proc_stats(proc.pid)
+            print(f"{n:>9}  {sent / elapsed:>10.0f}  {100 * (cpu1 - cpu0) / elapsed:>10.1f} %  {rss:>8.1f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--backends", type=int, nargs="+", default=[100, 1000, 10000, 20000])
+    p.add_argument("--rate", type=float, default=100000, help="samples per second")
+    p.add_argument("--batch", type=int, default=5000, help="samples per ingest call")
+    p.add_argument("--seconds", type=float, default=5, help="seconds of load to simulate (in-process)")
+    p.add_argument("--http", action="store_true", help="drive a real manager over HTTP instead")
+    p.add_argument("--duration", type=float, default=10, help="--http: seconds of load")
+    p.add_argument("--port", type=int, default=8195)
+    args = p.parse_args()
+
+    if args.http:
+        run_http(args)
+        sys.exit(0)
+    print(f"{'backends':>9}  {'cpu per s of load':>18}  {'state MiB':>10}")
+    for n in args.backends:
+        cpu, held = measure(run_store, n, args.rate, args.batch, args.seconds)
+        print(f"{n:>9}  {1000 * cpu / args.seconds:>15.1f} ms  {held / 2**20:>10.1f}")
@@ -1,10 +1,22 @@
 # manager.py
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
+import os
+import sys
 import time
 import math
+import struct
 import threading
 
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "manager"))
+from registry import Registry, expire_loop, registry_router  # noqa: E402  (manager/registry.py)
+from store import BackendStore, parse_quantile_weights  # noqa: E402  (manager/store.py)
+
 # Prometheus client (safe/idempotent registration)
 from prometheus_client import (
     CollectorRegistry,
@@ -48,34 +60,171 @@ latency_g = _make_metric_safe(Gauge, "aegis_backend_lat_ms", "Backend EWMA laten
 health_g = _make_metric_safe(Gauge, "aegis_backend_health", "Backend health 1/0", ["backend"])
 record_c = _make_metric_safe(Counter, "aegis_manager_record_total", "Records received by manager")
 record_created = _make_metric_safe(Gauge, "aegis_manager_record_created", "Records received by manager")
+quantile_g = _make_metric_safe(Gauge, "aegis_backend_latency_quantile_ms", "Backend latency quantile over the sketch window, ms", ["backend", "quantile"])
 # --- end safe prometheus init ---
 
-# in-memory EWMA state per backend
-class BackendState:
-    def __init__(self, alpha=0.3):
-        self.alpha = alpha
-        self.ewma_latency = None
-        self.count = 0
-        self.last_ts = None
-
-    def add_sample(self, sample):
-        self.count += 1
-        if self.ewma_latency is None:
-            self.ewma_latency = sample
-        else:
-            self.ewma_latency = self.alpha * sample + (1 - self.alpha) * self.ewma_latency
-        self.last_ts = time.time()
+# Per-backend state lives in a BackendStore (manager/store.py): NumPy columns indexed by row id,
+# latency quantiles from a dense log-binned histogram (relative error SKETCH_ACCURACY, so
+# 2% is ~330 bins a backend) over the last SKETCH_WINDOW_S/2 to SKETCH_WINDOW_S seconds. WEIGHT_QUANTILES "q:w,..." sets what a backend's weight is
+# computed from: 1 / sum(w * quantile q), so "0.5:1,0.99:1" penalizes a bad tail as much as a bad median.
+SKETCH_WINDOW_S = float(os.getenv("SKETCH_WINDOW_S", "60"))
+SKETCH_ACCURACY = float(os.getenv("SKETCH_ACCURACY", "0.02"))
+SKETCH_MAX_MS = float(os.getenv("SKETCH_MAX_MS", "60000"))  # slower samples land in the last bin
+WEIGHT_QUANTILES = parse_quantile_weights(os.getenv("WEIGHT_QUANTILES", "0.5:1,0.99:1"))
+REPORTED_QUANTILES = (0.5, 0.95, 0.99)  # the p50_ms/p95_ms/p99_ms of GET /weights
+# Only registered backends are tracked: MANAGER_BACKENDS at startup (never evicted) and those
+# that register through PUT /backends/{name}. RECORD_AUTO_REGISTER=1 lets /record register unknown names instead of
+# dropping their samples; those are evicted after STORE_EVICT_AFTER_S without a sample.
+MANAGER_BACKENDS = [b for b in os.getenv("MANAGER_BACKENDS", "backend1,backend2,backend3").split(",") if b]
+RECORD_AUTO_REGISTER = os.getenv("RECORD_AUTO_REGISTER", "0") == "1"
+STORE_MAX_BACKENDS = int(os.getenv("STORE_MAX_BACKENDS", "16384"))
+STORE_EVICT_AFTER_S = float(os.getenv("STORE_EVICT_AFTER_S", "600"))
+WEIGHTS_RECOMPUTE_S = float(os.getenv("WEIGHTS_RECOMPUTE_S", "0.5"))  # at most this often, however fast samples arrive
+REGISTRY_TTL_S = float(os.getenv("REGISTRY_TTL_S", "10"))  # default heartbeat ttl for self-registered backends
 
-    def get_score(self):
-        # lower latency -> higher weight. transform ewma to weight
-        if self.ewma_latency is None:
-            return 1.0
-        return 1.0 / (0.001 + self.ewma_latency)
+record_unknown_c = _make_metric_safe(Counter, "aegis_manager_record_unknown_total", "Samples dropped because their backend is not registered")
+backends_g = _make_metric_safe(Gauge, "aegis_manager_backends", "Registered backends")
 
 # global state
-BACKENDS = ["backend1", "backend2", "backend3"]
-state = {b: BackendState(alpha=0.2) for b in BACKENDS}
+store = BackendStore(window_s=SKETCH_WINDOW_S, relative_accuracy=SKETCH_ACCURACY, max_ms=SKETCH_MAX_MS,
+                     max_backends=STORE_MAX_BACKENDS)
+for _b in MANAGER_BACKENDS:
+    store.register(_b, pinned=True)
+members = Registry(ttl_s=REGISTRY_TTL_S)
 manual_weights = {}  # manual overrides (float values)
+_computed = (None, None, {})  # (monotonic time, store generation, weights)
+
+def computed_weights():
+    # {backend: {"weight", "p50_ms", "p95_ms", "p99_ms"[, "url", "path"]}} for the whole fleet from one vectorized
+    # pass, reused for WEIGHTS_RECOMPUTE_S unless a backend was registered or removed meanwhile
+    global _computed
+    at, generation, out = _computed
+    now = time.monotonic()
+    if at is not None and generation == store.generation and now - at < WEIGHTS_RECOMPUTE_S:
+        return out
+    rows, weights, reported = store.snapshot(WEIGHT_QUANTILES, REPORTED_QUANTILES)
+    keys = [f"p{round(q * 100)}_ms" for q in REPORTED_QUANTILES]
+    reported = np.where(np.isnan(reported), None, reported).tolist()
+    out = {}
+    for row, w, values in zip(rows.tolist(), weights.tolist(), reported):
+        entry = {"weight": w}
+        entry.update(zip(keys, values))
+        name = store.names[row]
+        url = members.url(name)
+        if url:
+            entry["url"] = url
+            path = members.path(name)
+            if path:
+                entry["path"] = path
+        out[name] = entry
+    _computed = (now, store.generation, out)
+    return out
+
+def current_weights():
+    # manual_weights, if set, replace the computed weights (and decide which backends are
+    # listed) but the quantiles stay measured
+    computed = computed_weights()
+    if manual_weights:
+        return {b: {**computed.get(b, {}), "weight": w, "manual": True} for b, w in manual_weights.items()}
+    return computed
+
+# --- weight streaming (GET /weights/stream) ---
+STREAM_MIN_INTERVAL_S = 0.05   # coalesce bursts of changes into one delta
+STREAM_KEEPALIVE_S = 15.0
+STREAM_QUEUE_SIZE = 64         # a subscriber this far behind is dropped and resyncs
+
+class WeightBroadcaster:
+    """
+    Publishes versioned weight deltas to /weights/stream subscribers.
+    Writers call mark_dirty(); run() diffs current_weights() against the last
+    published version at most every min_interval seconds.
+    """
+    def __init__(self, min_interval=STREAM_MIN_INTERVAL_S, queue_size=STREAM_QUEUE_SIZE):
+        self.min_interval = min_interval
+        self.queue_size = queue_size
+        self.version = 0
+        self.published = {}
+        self.subscribers = set()
+        self._dirty = asyncio.Event()
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    def snapshot(self):
+        return {"version": self.version, "weights": dict(self.published)}
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self.subscribers.discard(q)
+
+    def publish(self, weights):
+        changed = {k: v for k, v in weights.items() if self.published.get(k) != v}
+        removed = [k for k in self.published if k not in weights]
+        if not changed and not removed:
+            return None
+        self.version += 1
+        delta = {"version": self.version, "base": self.version - 1, "set": changed, "removed": removed}
+        self.published = dict(weights)
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait(delta)
+            except asyncio.QueueFull:
+                # slow consumer: end its stream (None) so the client reconnects and resyncs
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(None)
+                self.subscribers.discard(q)
+        return delta
+
+    async def run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            self.publish(current_weights())
+            await asyncio.sleep(self.min_interval)
+
+broadcaster = WeightBroadcaster()
+
+def _sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.on_event("startup")
+async def start_broadcaster():
+    broadcaster.publish(current_weights())
+    app.state.broadcaster_task = asyncio.create_task(broadcaster.run())
+    app.state.evict_task = asyncio.create_task(evict_loop())
+    app.state.expire_task = asyncio.create_task(expire_loop(members, _expired))
+
+def _ingest(names, idx, latency_s):
+    # names: the batch's backend names; idx[i]: index into names of sample i. One vectorized
+    # fold into the store; samples for unregistered backends are dropped (or register them
+    # with RECORD_AUTO_REGISTER). Returns (accepted, unknown).
+    name_rows = store.rows(names)
+    if RECORD_AUTO_REGISTER:
+        for i in np.flatnonzero(name_rows < 0):
+            try:
+                name_rows[i] = store.register(names[i])
+            except ValueError:
+                pass  # store full: counted as unknown
+    rows = name_rows[idx]
+    known = rows >= 0
+    accepted = int(known.sum())
+    unknown = len(rows) - accepted
+    store.add(rows[known], latency_s[known] * 1e3)
+    if accepted:
+        broadcaster.mark_dirty()
+    try:
+        record_c.inc(accepted)
+        record_unknown_c.inc(unknown)
+        record_created.set(time.time())
+    except Exception:
+        pass
+    return accepted, unknown
 
 @app.post("/record")
 async def record(payload: dict):
@@ -91,52 +240,145 @@ async def record(payload: dict):
     if not b:
         raise HTTPException(status_code=400, detail="missing backend")
 
-    if b not in state:
-        state[b] = BackendState(alpha=0.2)
-    state[b].add_sample(lat)
+    accepted, _ = _ingest([b], np.zeros(1, dtype=np.int64), np.array([lat]))
+    if not accepted:
+        raise HTTPException(status_code=404, detail=f"unknown backend {b!r}")
+    return {"status": "ok"}
 
-    # update prometheus metrics (safe to call repeatedly)
-    try:
-        # set latency gauge (ms)
-        latency_g.labels(backend=b).set(lat * 1e3)
-    except Exception:
-        # if latency_g is a collector object (existing registration), attempt attribute access
-        try:
-            latency_g.labels(backend=b).set(lat * 1e3)
-        except Exception:
-            pass
+# POST /record/batch bodies; the binary layout is written by manager_client.encode_samples
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+SAMPLES_CONTENT_TYPE = "application/x-aegis-samples"
+SAMPLES_MAGIC = b"AGS1"
+SAMPLE_DTYPE = np.dtype([("idx", "<u2"), ("status", "<u2"), ("latency_s", "<f4")])
 
-    try:
-        # set weight derived from EWMA
-        weight = state[b].get_score()
-        weight_g.labels(backend=b).set(weight)
-    except Exception:
-        pass
+def _decode_samples(body):
+    # -> (names, idx, latency_s) with no per-sample Python work
+    if body[:4] != SAMPLES_MAGIC:
+        raise ValueError("bad magic")
+    (n_names,) = struct.unpack_from("<H", body, 4)
+    off, names = 6, []
+    for _ in range(n_names):
+        size = body[off]
+        names.append(bytes(body[off + 1:off + 1 + size]).decode())
+        off += 1 + size
+    if (len(body) - off) % SAMPLE_DTYPE.itemsize:
+        raise ValueError("truncated record")
+    records = np.frombuffer(body, dtype=SAMPLE_DTYPE, offset=off)
+    if len(records) and int(records["idx"].max()) >= n_names:
+        raise ValueError("name index out of range")
+    return names, records["idx"].astype(np.int64), records["latency_s"].astype(np.float64)
 
-    # health is boolean 1/0 (we assume healthy on record)
-    try:
-        health_g.labels(backend=b).set(1.0)
-    except Exception:
-        pass
+def _decode_ndjson(body):
+    # one sample per line: {"backend": "b1", "latency_s": 0.05, "status_code": 200} or ["b1", 0.05, 200]
+    names, idx, lats = {}, [], []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if isinstance(item, list):
+            backend, lat = item[0], item[1]
+        else:
+            backend, lat = item["backend"], item.get("latency_s", 0.0)
+        if not backend:
+            raise ValueError("missing backend")
+        idx.append(names.setdefault(backend, len(names)))
+        lats.append(float(lat))
+    return list(names), np.array(idx, dtype=np.int64), np.array(lats, dtype=np.float64)
 
-    # increment record counter and update created gauge (timestamp-ish)
+@app.post("/record/batch")
+async def record_batch(request: Request):
+    """
+    Many samples per call: NDJSON (application/x-ndjson) or the packed binary
+    form (application/x-aegis-samples), folded into the store in one pass.
+    """
+    ctype = request.headers.get("content-type", "").split(";")[0].strip()
+    body = await request.body()
     try:
-        record_c.inc()
-        record_created.set(time.time())
-    except Exception:
-        pass
+        if ctype == SAMPLES_CONTENT_TYPE:
+            decoded = _decode_samples(body)
+        elif ctype == NDJSON_CONTENT_TYPE:
+            decoded = _decode_ndjson(body)
+        else:
+            raise HTTPException(status_code=415, detail=f"expected {SAMPLES_CONTENT_TYPE} or {NDJSON_CONTENT_TYPE}")
+    except (ValueError, KeyError, IndexError, TypeError, struct.error, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"bad payload: {e}")
 
-    return {"status": "ok"}
+    accepted, unknown = _ingest(*decoded)
+    return {"status": "ok", "accepted": accepted, "unknown": unknown}
+
+# --- backend registry ---
+# Backends announce themselves with PUT /backends/{name} {"url"} and heartbeat (manager/registry.py);
+# one that misses heartbeats for REGISTRY_TTL_S is dropped. Registered backends are pinned in the
+# store (the ttl, not idleness, decides when they go) and their url is part of their weight entry,
+# so routers following /weights/stream add or drop them within one delta.
+def _join(name, url, path=None):
+    global _computed
+    store.register(name, pinned=True)
+    if members.url(name) != url or members.path(name) != path:
+        _computed = (None, None, {})  # same members, new address: the cached weights are stale
+    broadcaster.mark_dirty()
+
+def _leave(name):
+    members.deregister(name)
+    return _expired(name)
+
+def _expired(name):
+    # a MANAGER_BACKENDS member that left or went quiet stays tracked and only loses its url; that
+    # doesn't move the store generation, so the cached weights (still carrying the url) are reset here
+    global _computed
+    _computed = (None, None, {})
+    known = name in store.ids if name in MANAGER_BACKENDS else store.deregister(name)
+    broadcaster.mark_dirty()
+    return known
+
+def _describe_backends():
+    now = time.monotonic()
+    described = members.describe()
+    return {name: {"pinned": bool(store.pinned[row]), "samples": int(store.count[row]),
+                   "idle_s": now - float(store.last_seen[row]), **described.get(name, {})}
+            for name, row in store.ids.items()}
+
+app.include_router(registry_router(members, _join, _leave, _describe_backends))
+
+async def evict_loop():
+    while True:
+        await asyncio.sleep(min(30.0, STORE_EVICT_AFTER_S / 4))
+        if store.evict_stale(STORE_EVICT_AFTER_S):
+            broadcaster.mark_dirty()
 
 @app.get("/weights")
 async def get_weights():
-    # if manual_weights set, return them; else compute from EWMA
-    if manual_weights:
-        return manual_weights
-    out = {}
-    for b, s in state.items():
-        out[b] = s.get_score()
-    return out
+    # plain json.dumps: FastAPI's jsonable_encoder walk costs more than the weights at fleet scale
+    return JSONResponse(current_weights())
+
+@app.get("/weights/stream")
+async def stream_weights():
+    """
+    Server-sent events: one `snapshot` event, then a `delta` event
+    {"version", "base", "set", "removed"} per published change. A client
+    whose last version != base has missed an update and must reconnect.
+    """
+    q = broadcaster.subscribe()
+    snap = broadcaster.snapshot()
+
+    async def events():
+        try:
+            yield _sse("snapshot", snap, snap["version"])
+            while True:
+                try:
+                    delta = await asyncio.wait_for(q.get(), timeout=STREAM_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if delta is None:
+                    break
+                if delta["version"] <= snap["version"]:
+                    continue  # already folded into the snapshot
+                yield _sse("delta", delta, delta["version"])
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 class WeightsIn(BaseModel):
     __root__: dict
@@ -157,6 +399,7 @@ async def set_weights(wi: WeightsIn):
     # update manual override map
     manual_weights.clear()
     manual_weights.update(cleaned)
+    broadcaster.mark_dirty()
 
     # reflect manual weights into prometheus gauges too
     for bk, val in cleaned.items():
@@ -170,6 +413,7 @@ async def set_weights(wi: WeightsIn):
 @app.delete("/weights")
 async def clear_weights():
     manual_weights.clear()
+    broadcaster.mark_dirty()
     return {"status": "ok"}
 
 @app.get("/metrics")
@@ -177,6 +421,24 @@ async def metrics():
     """
     Expose Prometheus metrics in the standard text format.
     """
+    # per-backend series are rebuilt at scrape time, so evicted backends disappear
+    weights = current_weights()
+    for g in (weight_g, latency_g, health_g, quantile_g):
+        try:
+            g.clear()
+        except Exception:
+            pass
+    for b, entry in weights.items():
+        weight_g.labels(backend=b).set(entry["weight"])
+        health_g.labels(backend=b).set(1.0)
+        row = store.ids.get(b)
+        if row is not None and not np.isnan(store.ewma_ms[row]):
+            latency_g.labels(backend=b).set(float(store.ewma_ms[row]))
+        for q in REPORTED_QUANTILES:
+            v = entry.get(f"p{round(q * 100)}_ms")
+            if v is not None:
+                quantile_g.labels(backend=b, quantile=str(q)).set(v)
+    backends_g.set(len(store))
     payload = generate_latest(registry)
     return Response(content=payload, media_type=CONTENT_TYPE_LATEST)
 
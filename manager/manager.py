@@ -1,64 +1,233 @@
 # manager/manager.py
 import asyncio
+import os
+import random
 import time
 from fastapi import FastAPI
 import uvicorn
 import httpx
-from prometheus_client import Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import Response
 
+from registry import Registry, expire_loop, registry_router
+from store import BackendStore, parse_quantile_weights
+
 app = FastAPI()
+# same "name=url,..." format as the router's BACKEND_URLS; these are static, anything else
+# joins through PUT /backends/{name} and heartbeats (registry.py)
 BACKENDS = [
-    {"name": "backend1", "url": "http://backend1:8101"},
-    {"name": "backend2", "url": "http://backend2:8102"},
-    {"name": "backend3", "url": "http://backend3:8103"},
+    {"name": name, "url": url}
+    for name, url in (item.split("=", 1) for item in os.getenv(
+        "BACKEND_URLS",
+        "backend1=http://backend1:8101,backend2=http://backend2:8102,backend3=http://backend3:8103",
+    ).split(",") if item)
 ]
 EWMA_ALPHA = 0.3
 
+# Each backend is probed on its own timer, every PROBE_INTERVAL_S, on a cheap health
+# endpoint; every INFER_PROBE_EVERY-th probe is one synthetic inference request instead,
+# which is what feeds its latency EWMA. A hung backend only delays its own next probe.
+# Timers start at a random offset of up to PROBE_JITTER * PROBE_INTERVAL_S so a large
+# fleet isn't hit all at once. Weights are recomputed every PROBE_INTERVAL_S.
+PROBE_INTERVAL_S = float(os.getenv("PROBE_INTERVAL_S", "1.0"))
+PROBE_TIMEOUT_S = float(os.getenv("PROBE_TIMEOUT_S", "2.0"))
+PROBE_JITTER = float(os.getenv("PROBE_JITTER", "0.2"))
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "64"))
+HEALTH_PATH = os.getenv("HEALTH_PATH", "/healthz")
+INFER_PATH = os.getenv("INFER_PATH", "/infer")
+INFER_PROBE_EVERY = int(os.getenv("INFER_PROBE_EVERY", "10"))  # 0 = health probes only
+
+# inference probe latencies also go into the same windowed quantile histograms manager.py uses
+# (store.py: relative error SKETCH_ACCURACY over the last SKETCH_WINDOW_S/2 to SKETCH_WINDOW_S s);
+# weights are 1 / sum(w * quantile q) over WEIGHT_QUANTILES "q:w,...", so a bad tail costs weight too
+SKETCH_WINDOW_S = float(os.getenv("SKETCH_WINDOW_S", "60"))
+SKETCH_ACCURACY = float(os.getenv("SKETCH_ACCURACY", "0.01"))
+WEIGHT_QUANTILES = parse_quantile_weights(os.getenv("WEIGHT_QUANTILES", "0.5:1,0.99:1"))
+REPORTED_QUANTILES = (0.5, 0.95, 0.99)
+REGISTRY_TTL_S = float(os.getenv("REGISTRY_TTL_S", "10"))  # default heartbeat ttl for registered backends
+
 weights_gauge = Gauge("aegis_backend_weight", "Backend weight", ["backend"])
 latency_gauge = Gauge("aegis_backend_lat_ms", "Backend EWMA latency ms", ["backend"])
 health_gauge = Gauge("aegis_backend_health", "Backend health 1/0", ["backend"])
+probe_cycle = Histogram("aegis_manager_probe_cycle_seconds", "Time between the starts of consecutive probes of one backend")
+probe_duration = Histogram("aegis_manager_probe_duration_seconds", "Duration of a single probe", ["kind"])
+probes_total = Counter("aegis_manager_probes_total", "Probes sent", ["kind", "result"])
+probe_backends = Gauge("aegis_manager_probe_backends", "Backends probed per cycle")
+quantile_gauge = Gauge("aegis_backend_latency_quantile_ms", "Backend latency quantile over the sketch window, ms", ["backend", "quantile"])
+membership_c = Counter("aegis_manager_membership_changes_total", "Backends joining or leaving", ["change"])
+
+state = {}
+registry = Registry(ttl_s=REGISTRY_TTL_S)
+store = BackendStore(window_s=SKETCH_WINDOW_S, relative_accuracy=SKETCH_ACCURACY)
+
+def _join(name, url, path=None):
+    # path: where the backend serves inference if not INFER_PATH; its inference probes go there
+    if not url:
+        raise ValueError("a url is required to register with the probing manager")
+    s = state.get(name)
+    if s is None:
+        store.register(name, pinned=True)  # ValueError when full
+        state[name] = {"url": url, "path": path, "ewma": None, "healthy": 1, "weight": 1.0 / (len(state) + 1)}
+        membership_c.labels("join").inc()
+    elif s["url"] != url or s["path"] != path:
+        # same name, new address (a restarted replica): its old latencies say nothing about the new one
+        store.deregister(name)
+        store.register(name, pinned=True)
+        s.update(url=url, path=path, ewma=None, healthy=1)
+
+def _leave(name):
+    if state.pop(name, None) is None:
+        return False
+    store.deregister(name)
+    membership_c.labels("leave").inc()
+    for g in (weights_gauge, latency_gauge, health_gauge):
+        try:
+            g.remove(name)
+        except KeyError:
+            pass
+    for q in REPORTED_QUANTILES:
+        try:
+            quantile_gauge.remove(name, str(q))
+        except KeyError:
+            pass
+    return True
+
+def _expired(name):
+    # a BACKEND_URLS member that registered and then went quiet falls back to its configured url
+    static = next((b["url"] for b in BACKENDS if b["name"] == name), None)
+    if static:
+        _join(name, static)
+    else:
+        _leave(name)
+
+for b in BACKENDS:
+    _join(b["name"], b["url"])
 
-state = {b["name"]: {"ewma": None, "healthy": 1} for b in BACKENDS}
+def latency_cost(s, values):
+    # ms; from the configured quantiles (`values`, from store.quantiles), or the EWMA until the
+    # window has samples
+    if not values or values[0] is None:
+        return s["ewma"] or 1000.0
+    return sum(w * v for (_, w), v in zip(WEIGHT_QUANTILES, values))
+
+def add_sample(name, s, latency_ms):
+    if state.get(name) is s:  # not for a backend that left while it was being probed
+        store.add([store.ids[name]], [latency_ms])
+
+async def probe(client, sem, name, s, cycle):
+    # `s` is the state entry as of the start of the probe; if the backend leaves meanwhile the
+    # result lands in that orphaned dict and the gauges aren't touched
+    async with sem:
+        kind = "infer" if INFER_PROBE_EVERY and cycle % INFER_PROBE_EVERY == 0 else "health"
+        try:
+            t0 = time.time()
+            path = (s["path"] or INFER_PATH) if kind == "infer" else HEALTH_PATH
+            r = await client.get(s["url"] + path, timeout=PROBE_TIMEOUT_S)
+            r.raise_for_status()
+            latency = (time.time() - t0) * 1000
+            if kind == "infer":
+                prev = s["ewma"]
+                s["ewma"] = latency if prev is None else (EWMA_ALPHA*latency + (1-EWMA_ALPHA)*prev)
+                add_sample(name, s, latency)
+            s["healthy"] = 1
+            probes_total.labels(kind, "ok").inc()
+        except Exception:
+            s["healthy"] = 0
+            s["ewma"] = (s["ewma"] or 1000) * 1.5
+            if kind == "infer":
+                add_sample(name, s, (time.time() - t0) * 1000)  # a timeout is tail latency too
+            probes_total.labels(kind, "error").inc()
+        probe_duration.labels(kind).observe(time.time() - t0)
+    if state.get(name) is s:
+        latency_gauge.labels(name).set(s["ewma"] or 0)
+        health_gauge.labels(name).set(s["healthy"])
+
+async def backend_probe_loop(client, sem, name):
+    # one backend's timer: runs until the backend leaves
+    await asyncio.sleep(random.uniform(0, PROBE_JITTER * PROBE_INTERVAL_S))
+    cycle, next_at, last_start = 0, time.monotonic(), None
+    while True:
+        s = state.get(name)
+        if s is None:
+            return
+        now = time.monotonic()
+        if last_start is not None:
+            probe_cycle.observe(now - last_start)
+        last_start = now
+        await probe(client, sem, name, s, cycle)
+        cycle += 1
+        # fixed rate; a probe that ran past its slot (a timeout) starts the next one right away
+        next_at = max(next_at + PROBE_INTERVAL_S, time.monotonic())
+        await asyncio.sleep(next_at - time.monotonic())
+
+def recompute_weights():
+    total = 0.0
+    invs = {}
+    quantiles = store.quantiles([q for q, _ in WEIGHT_QUANTILES])
+    for name, s in state.items():
+        val = latency_cost(s, quantiles.get(name))
+        inv = (1.0 / val) if s["healthy"]==1 else 0.0001
+        invs[name] = inv
+        total += inv
+    for name, inv in invs.items():
+        w = (inv / total) if total > 0 else 1.0/len(invs)
+        state[name]["weight"] = w
+        weights_gauge.labels(name).set(w)
 
 async def probe_loop():
-    async with httpx.AsyncClient(timeout=3.0) as client:
-        while True:
-            for b in BACKENDS:
-                name = b["name"]
-                try:
-                    t0 = time.time()
-                    r = await client.get(b["url"] + "/infer", timeout=2.0)
-                    latency = (time.time() - t0) * 1000
-                    prev = state[name]["ewma"]
-                    state[name]["ewma"] = latency if prev is None else (EWMA_ALPHA*latency + (1-EWMA_ALPHA)*prev)
-                    state[name]["healthy"] = 1
-                except Exception:
-                    state[name]["healthy"] = 0
-                    state[name]["ewma"] = (state[name]["ewma"] or 1000) * 1.5
-                latency_gauge.labels(name).set(state[name]["ewma"] or 0)
-                health_gauge.labels(name).set(state[name]["healthy"])
-            total = 0.0
-            invs = {}
-            for name, s in state.items():
-                val = s["ewma"] or 1000.0
-                inv = (1.0 / val) if s["healthy"]==1 else 0.0001
-                invs[name] = inv
-                total += inv
-            for name, inv in invs.items():
-                w = (inv / total) if total > 0 else 1.0/len(BACKENDS)
-                weights_gauge.labels(name).set(w)
-            await asyncio.sleep(1.0)
+    # starts a timer for every backend that joins, lets timers of departed ones finish, and
+    # recomputes weights from whatever the probes have found so far
+    sem = asyncio.Semaphore(PROBE_CONCURRENCY)
+    limits = httpx.Limits(max_connections=PROBE_CONCURRENCY, max_keepalive_connections=PROBE_CONCURRENCY)
+    tasks = {}
+    async with httpx.AsyncClient(timeout=PROBE_TIMEOUT_S, limits=limits) as client:
+        try:
+            while True:
+                for name in [n for n, t in tasks.items() if t.done()]:
+                    del tasks[name]
+                for name in state:
+                    if name not in tasks:
+                        tasks[name] = asyncio.create_task(backend_probe_loop(client, sem, name))
+                probe_backends.set(len(state))
+                recompute_weights()
+                await asyncio.sleep(PROBE_INTERVAL_S)
+        finally:
+            for t in tasks.values():
+                t.cancel()
+
+@app.on_event("startup")
+async def startup():
+    # started here so it runs under `uvicorn manager:app` too, not only `python manager.py`
+    app.state.probe_task = asyncio.create_task(probe_loop())
+    app.state.expire_task = asyncio.create_task(expire_loop(registry, _expired))
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.probe_task.cancel()
+    app.state.expire_task.cancel()
+
+app.include_router(registry_router(registry, _join, _leave))
 
 @app.get("/weights")
 def weights():
-    return {name: {"ewma_ms": state[name]["ewma"], "healthy": state[name]["healthy"]} for name in state}
+    out = {}
+    reported = store.quantiles(REPORTED_QUANTILES)
+    for name, s in state.items():
+        entry = {"weight": s["weight"], "ewma_ms": s["ewma"], "healthy": s["healthy"], "url": s["url"]}
+        if s["path"]:
+            entry["path"] = s["path"]
+        for q, v in zip(REPORTED_QUANTILES, reported.get(name, ())):
+            entry[f"p{round(q * 100)}_ms"] = v
+        out[name] = entry
+    return out
 
 @app.get("/metrics")
 def metrics():
+    for name, values in store.quantiles(REPORTED_QUANTILES).items():
+        for q, v in zip(REPORTED_QUANTILES, values):
+            if v is not None:
+                quantile_gauge.labels(name, str(q)).set(v)
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    loop.create_task(probe_loop())
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,104 @@
+# manager/registry.py
+# Backend membership by registration and heartbeats. A backend announces
+# itself (name + url) when it starts and then heartbeats; a backend that
+# misses heartbeats for its ttl is expired, so replicas can be added and
+# removed under load without touching any config.
+#
+#   GET    /backends                  members
+#   PUT    /backends/{name}           {"url": "http://10.0.0.7:8101", "path": "/infer", "ttl_s": 10} register
+#                                     (or re-register); path: where it serves predictions, if not the router's default
+#   POST   /backends/{name}/heartbeat 404 when the manager doesn't know the name: register again
+#   DELETE /backends/{name}           leave now (graceful shutdown)
+import asyncio
+import time
+
+from fastapi import APIRouter, Body, HTTPException
+
+class Registry:
+    def __init__(self, ttl_s=10.0, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.members = {}  # name -> {"url", "path", "ttl_s", "registered_at", "heartbeat_at"}
+
+    def register(self, name, url=None, ttl_s=None, path=None):
+        now = self.clock()
+        new = name not in self.members
+        entry = self.members.setdefault(name, {"registered_at": now})
+        entry.update(url=url, path=path, ttl_s=float(ttl_s or self.ttl_s), heartbeat_at=now)
+        return new
+
+    def heartbeat(self, name):
+        entry = self.members.get(name)
+        if entry is None:
+            return False
+        entry["heartbeat_at"] = self.clock()
+        return True
+
+    def deregister(self, name):
+        return self.members.pop(name, None) is not None
+
+    def expire(self):
+        now = self.clock()
+        expired = [name for name, e in self.members.items() if now - e["heartbeat_at"] > e["ttl_s"]]
+        for name in expired:
+            del self.members[name]
+        return expired
+
+    def url(self, name):
+        entry = self.members.get(name)
+        return entry and entry["url"]
+
+    def path(self, name):
+        entry = self.members.get(name)
+        return entry and entry["path"]
+
+    def describe(self):
+        now = self.clock()
+        return {name: {"url": e["url"], "path": e["path"], "ttl_s": e["ttl_s"], "since_heartbeat_s": now - e["heartbeat_at"]}
+                for name, e in self.members.items()}
+
+async def expire_loop(registry, on_leave, interval_s=None):
+    while True:
+        await asyncio.sleep(interval_s or registry.ttl_s / 3)
+        for name in registry.expire():
+            on_leave(name)
+
+def registry_router(registry, on_join, on_leave, describe=None):
+    # on_join(name, url, path) may raise ValueError to refuse (e.g. the manager is full); on_leave(name)
+    # -> whether the manager knew the backend. describe() -> GET /backends, registry.describe by default.
+    router = APIRouter(prefix="/backends")
+
+    @router.get("")
+    async def list_backends():
+        return (describe or registry.describe)()
+
+    @router.put("/{name}")
+    async def register_backend(name: str, body: dict = Body(default={})):
+        url = body.get("url")
+        if url is not None and not str(url).startswith(("http://", "https://")):
+            raise HTTPException(status_code=400, detail=f"url must be http(s), got {url!r}")
+        path = body.get("path")
+        if path is not None and not str(path).startswith("/"):
+            raise HTTPException(status_code=400, detail=f"path must start with '/', got {path!r}")
+        try:
+            on_join(name, url, path)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        registry.register(name, url, body.get("ttl_s"), path)
+        ttl_s = registry.members[name]["ttl_s"]
+        return {"status": "ok", "ttl_s": ttl_s, "heartbeat_s": ttl_s / 3}
+
+    @router.post("/{name}/heartbeat")
+    async def heartbeat(name: str):
+        if not registry.heartbeat(name):
+            raise HTTPException(status_code=404, detail=f"unknown backend {name!r}, register again")
+        return {"status": "ok"}
+
+    @router.delete("/{name}")
+    async def deregister_backend(name: str):
+        known = registry.deregister(name)
+        if not on_leave(name) and not known:
+            raise HTTPException(status_code=404, detail=f"unknown backend {name!r}")
+        return {"status": "ok"}
+
+    return router
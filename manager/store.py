@@ -0,0 +1,218 @@
+# manager/store.py
+# Array-backed state for every backend the manager knows. Backends get a row
+# id from an explicit registry (register / deregister / evict_stale) and each
+# per-backend field is a column in a NumPy array, so folding in a batch of
+# samples and recomputing every weight are a few vectorized operations
+# whatever the size of the fleet.
+#
+# Latency quantiles come from a dense DDSketch-style histogram per row: bin i
+# (i >= 1) holds latencies in (min_ms * gamma**(i-1), min_ms * gamma**i], so a
+# quantile read from it is within `relative_accuracy` of the real one. The
+# sliding window is two histograms, for the current and the previous half of
+# window_s, so quantiles cover the last window_s/2 to window_s seconds and
+# everything stays in integer arithmetic. This is the only quantile sketch in
+# the manager: both manager.py and the probing manager/manager.py use it.
+import math
+import time
+
+import numpy as np
+
+class BackendStore:
+    def __init__(self, window_s=60.0, relative_accuracy=0.01, min_ms=0.1, max_ms=60000.0, alpha=0.2,
+                 capacity=64, max_backends=16384, clock=time.monotonic):
+        self.window_s = window_s
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_ms = min_ms
+        self.n_bins = math.ceil(math.log(max_ms / min_ms) / self._log_gamma) + 1  # the last one also takes > max_ms
+        self.bin_ms = np.empty(self.n_bins)
+        self.bin_ms[0] = min_ms / 2
+        self.bin_ms[1:] = min_ms * 2 * self.gamma ** np.arange(1, self.n_bins) / (self.gamma + 1)
+        self.alpha = alpha
+        self.max_backends = max_backends
+        self.clock = clock
+        self.ids = {}  # name -> row
+        self.names = []  # row -> name, None for a free row
+        self.free = []
+        self.generation = 0  # bumped on every registry change
+        self.period_start = clock()
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = getattr(self, "capacity", 0)
+        def grow(arr, fill):
+            new = np.full((capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+            new[:old] = arr[:old]
+            return new
+        if old:
+            self.active, self.pinned = grow(self.active, False), grow(self.pinned, False)
+            self.ewma_ms, self.count = grow(self.ewma_ms, np.nan), grow(self.count, 0)
+            self.last_seen = grow(self.last_seen, 0.0)
+            self.cur, self.prev = grow(self.cur, 0), grow(self.prev, 0)
+        else:
+            self.active = np.zeros(capacity, dtype=bool)
+            self.pinned = np.zeros(capacity, dtype=bool)  # never evicted for being idle
+            self.ewma_ms = np.full(capacity, np.nan)
+            self.count = np.zeros(capacity, dtype=np.int64)
+            self.last_seen = np.zeros(capacity)
+            self.cur = np.zeros((capacity, self.n_bins), dtype=np.uint32)
+            self.prev = np.zeros((capacity, self.n_bins), dtype=np.uint32)
+        self.capacity = capacity
+
+    # --- registry ------------------------------------------------------
+
+    def register(self, name, pinned=False):
+        row = self.ids.get(name)
+        if row is not None:
+            self.pinned[row] |= pinned
+            return row
+        if len(self.ids) >= self.max_backends:
+            raise ValueError(f"backend store is full ({self.max_backends} backends)")
+        if self.free:
+            row = self.free.pop()
+            self.names[row] = name
+        else:
+            row = len(self.names)
+            if row >= self.capacity:
+                self._alloc(self.capacity * 2)
+            self.names.append(name)
+        self.ids[name] = row
+        self.active[row] = True
+        self.pinned[row] = pinned
+        self.last_seen[row] = self.clock()
+        self.generation += 1
+        return row
+
+    def deregister(self, name):
+        row = self.ids.pop(name, None)
+        if row is None:
+            return False
+        self.names[row] = None
+        self.active[row] = self.pinned[row] = False
+        self.ewma_ms[row] = np.nan
+        self.count[row] = 0
+        self.cur[row] = self.prev[row] = 0
+        self.free.append(row)
+        self.generation += 1
+        return True
+
+    def evict_stale(self, max_idle_s):
+        # unpinned backends without a sample for max_idle_s
+        n = len(self.names)
+        stale = np.flatnonzero(self.active[:n] & ~self.pinned[:n] & (self.last_seen[:n] < self.clock() - max_idle_s))
+        names = [self.names[row] for row in stale]
+        for name in names:
+            self.deregister(name)
+        return names
+
+    def rows(self, names):
+        # row ids for names, -1 for unregistered ones
+        return np.array([self.ids.get(name, -1) for name in names], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- samples -------------------------------------------------------
+
+    def _rotate(self, now):
+        periods = int((now - self.period_start) // (self.window_s / 2))
+        if periods <= 0:
+            return
+        if periods == 1:
+            self.prev, self.cur = self.cur, self.prev
+            self.cur[:] = 0
+        else:
+            self.cur[:] = 0
+            self.prev[:] = 0
+        self.period_start += periods * self.window_s / 2
+
+    def add(self, rows, latency_ms):
+        # rows: registered row ids; latency_ms: one sample each, same length
+        if not len(rows):
+            return
+        now = self.clock()
+        self._rotate(now)
+        rows = np.asarray(rows, dtype=np.int64)
+        latency_ms = np.asarray(latency_ms, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bins = np.ceil(np.log(latency_ms / self.min_ms) / self._log_gamma)
+        bins = np.clip(np.nan_to_num(bins, nan=0.0, neginf=0.0), 0, self.n_bins - 1).astype(np.int64)
+        np.add.at(self.cur, (rows, bins), 1)
+        n = len(self.names)
+        k = np.bincount(rows, minlength=n)
+        touched = np.flatnonzero(k)
+        # the batch folds into the EWMA as k samples of its mean (exact for k == 1)
+        mean = np.bincount(rows, weights=latency_ms, minlength=n)[touched] / k[touched]
+        keep = (1 - self.alpha) ** k[touched]
+        prev = self.ewma_ms[touched]
+        self.ewma_ms[touched] = np.where(np.isnan(prev), mean, keep * prev + (1 - keep) * mean)
+        self.count[:n] += k
+        self.last_seen[touched] = now
+
+    # --- weights -------------------------------------------------------
+
+    def _quantile_fn(self):
+        # -> (live rows, empty, quantile): quantile(q) is q in ms for every row in [:n] (NaN where
+        # `empty`, the window has no samples), all q from one cumulative pass
+        self._rotate(self.clock())
+        n = len(self.names)
+        # free rows are all zeros, so work on the whole [:n] block and pick the live rows at the end
+        cum = np.add(self.cur[:n], self.prev[:n])
+        np.cumsum(cum, axis=1, out=cum)
+        total = cum[:, -1]
+        empty = total == 0
+        computed = {}
+
+        def quantile(q):
+            if q not in computed:
+                rank = (q * (total.astype(np.float64) - 1)).clip(0).astype(np.uint32)
+                out = self.bin_ms[np.argmax(cum > rank[:, None], axis=1)]
+                out[empty] = np.nan
+                computed[q] = out
+            return computed[q]
+
+        return np.flatnonzero(self.active[:n]), empty, quantile
+
+    def quantiles(self, qs):
+        """
+        {name: [quantile q in ms or None, ...] for q in qs} for every registered
+        backend; None while its window is empty.
+        """
+        rows, _, quantile = self._quantile_fn()
+        if not qs:
+            return {self.names[r]: [] for r in rows.tolist()}
+        values = np.column_stack([quantile(q) for q in qs])[rows]
+        values = np.where(np.isnan(values), None, values).tolist()
+        return {self.names[r]: v for r, v in zip(rows.tolist(), values)}
+
+    def snapshot(self, weight_quantiles, report_quantiles=()):
+        """
+        One pass over the fleet. Returns (rows, weights, reported) where
+        weights[i] = 1 / (0.001 + sum(w * quantile q) in seconds) over
+        weight_quantiles [(q, w), ...] (the EWMA stands in for a backend with
+        nothing in its window, 1.0 for one never seen) and reported[i, j] is
+        report_quantiles[j] in ms (NaN when the window is empty).
+        """
+        rows, empty, quantile = self._quantile_fn()
+        n = len(self.names)
+        cost_ms = sum(w * quantile(q) for q, w in weight_quantiles)
+        cost_ms = np.where(empty, self.ewma_ms[:n], cost_ms)
+        weights = np.where(np.isnan(cost_ms), 1.0, 1.0 / (0.001 + cost_ms / 1e3))
+        reported = np.column_stack([quantile(q) for q in report_quantiles]) if report_quantiles \
+            else np.empty((n, 0))
+        return rows, weights[rows], reported[rows]
+
+def parse_quantile_weights(spec):
+    # "0.5:1,0.99:2" -> [(0.5, 1.0), (0.99, 2.0)]: a backend's cost is the weighted sum of those quantiles
+    out = []
+    for item in spec.split(","):
+        q, sep, w = item.strip().partition(":")
+        if not q:
+            continue
+        q, w = float(q), float(w) if sep else 1.0
+        if not 0 <= q <= 1 or w < 0:
+            raise ValueError(f"bad quantile weight {item!r}")
+        out.append((q, w))
+    if not out:
+        raise ValueError(f"no quantiles in {spec!r}")
+    return out
@@ -1,13 +1,36 @@
 # manager_client.py
 import httpx
 import asyncio
-from typing import Dict, Any
+import json
+import struct
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+# POST /record/batch body, Content-Type SAMPLES_CONTENT_TYPE (decoded by manager.py):
+#   b"AGS1", u16 name count, per name u8 length + utf-8, then 8-byte records
+#   (u16 name index, u16 status code, f32 latency seconds) to the end of the body
+SAMPLES_CONTENT_TYPE = "application/x-aegis-samples"
+SAMPLES_MAGIC = b"AGS1"
+SAMPLE = struct.Struct("<HHf")
+
+def encode_samples(samples: Iterable[Tuple[str, float, int]]) -> bytes:
+    # samples: (backend, latency_s, status_code)
+    names: Dict[str, int] = {}
+    records = bytearray()
+    for backend, latency_s, status in samples:
+        idx = names.setdefault(backend, len(names))
+        records += SAMPLE.pack(idx, status, latency_s)
+    head = bytearray(SAMPLES_MAGIC + struct.pack("<H", len(names)))
+    for name in names:
+        encoded = name.encode()
+        head += struct.pack("<B", len(encoded)) + encoded
+    return bytes(head + records)
 
 class ManagerClient:
     def __init__(self, host: str = "manager", port: int = 8001, timeout: float = 5.0):
         self.base = f"http://{host}:{port}"
         self._client = None
         self.timeout = timeout
+        self.stream_version: Optional[int] = None
 
     async def _get_client(self):
         if self._client is None:
@@ -20,7 +43,82 @@ class ManagerClient:
         r.raise_for_status()
         return r.json()
 
+    async def record_batch(self, samples) -> Dict[str, Any]:
+        client = await self._get_client()
+        r = await client.post(f"{self.base}/record/batch", content=encode_samples(samples),
+                              headers={"Content-Type": SAMPLES_CONTENT_TYPE})
+        r.raise_for_status()
+        return r.json()
+
+    async def subscribe_weights(
+        self,
+        on_update: Callable[[Dict[str, Any]], Optional[Awaitable[None]]],
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+        read_timeout: float = 45.0,
+    ):
+        """
+        Follow GET /weights/stream forever, calling on_update(weights) with the
+        full weight map after the snapshot, after every applied delta and on
+        every keepalive (so callers can use it as a liveness signal).
+
+        A delta whose base doesn't match the local version means an update was
+        missed; the stream is reopened to resync from a fresh snapshot.
+        Connection errors reconnect with exponential backoff.
+        """
+        delay = reconnect_delay
+        timeout = httpx.Timeout(self.timeout, read=read_timeout)
+        while True:
+            weights: Dict[str, Any] = {}
+            self.stream_version = None
+            resync = False
+            try:
+                client = await self._get_client()
+                async with client.stream("GET", f"{self.base}/weights/stream", timeout=timeout) as r:
+                    r.raise_for_status()
+                    async for event, data in _iter_sse(r):
+                        if event == "snapshot":
+                            weights = dict(data["weights"])
+                            self.stream_version = data["version"]
+                        elif event == "delta":
+                            if data.get("base") != self.stream_version:
+                                resync = True
+                                break
+                            weights.update(data.get("set", {}))
+                            for k in data.get("removed", []):
+                                weights.pop(k, None)
+                            self.stream_version = data["version"]
+                        elif self.stream_version is None:
+                            continue
+                        delay = reconnect_delay
+                        res = on_update(weights)
+                        if asyncio.iscoroutine(res):
+                            await res
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            if resync:
+                continue
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
     async def close(self):
         if self._client:
             await self._client.aclose()
             self._client = None
+
+async def _iter_sse(response):
+    # minimal text/event-stream parser: yields (event, parsed data); keepalive comments yield ("keepalive", None)
+    event, data = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith(":"):
+            yield "keepalive", None
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
@@ -0,0 +1,18 @@
+# routing/__init__.py
+# Shared router implementation. The FastAPI app lives in routing.app; router.py
+# and router/router.py are just entrypoints for the two compose stacks.
+from .policies import POLICIES, Policy, make_policy, register_policy
+from .pool import BackendPool
+from .stats import BackendStats
+from .weights import WeightTable, normalize_weights
+
+__all__ = [
+    "POLICIES",
+    "Policy",
+    "make_policy",
+    "register_policy",
+    "BackendPool",
+    "BackendStats",
+    "WeightTable",
+    "normalize_weights",
+]
@@ -0,0 +1,111 @@
+# routing/admission.py
+# Router-wide admission control. At most `max_inflight` requests are worked on
+# at once; the rest wait in a bounded FIFO queue per priority class and are let
+# in strictly by priority. Each class may only fill its `share` of max_inflight,
+# so low-priority traffic hits its ceiling (and is shed) while higher classes
+# still have headroom.
+import asyncio
+from collections import deque
+
+class AdmissionRejected(Exception):
+    def __init__(self, cls, reason, status):
+        super().__init__(f'{cls} request rejected: {reason}')
+        self.cls = cls
+        self.reason = reason  # queue_full | timeout
+        self.status = status
+
+class PriorityClass:
+    def __init__(self, name, queue_size, share):
+        self.name = name
+        self.queue_size = queue_size
+        self.share = share
+        self.waiters = deque()
+
+def parse_classes(spec):
+    # "interactive:100:1.0,batch:50:0.7" -> [(name, queue_size, share), ...], highest priority first
+    out = []
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if not parts[0]:
+            continue
+        queue_size = int(parts[1]) if len(parts) > 1 and parts[1] else 100
+        share = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        out.append((parts[0], queue_size, share))
+    return out
+
+class AdmissionController:
+    """
+    acquire(cls) returns once the request may proceed, or raises
+    AdmissionRejected: 429 when the class queue is already full (shed
+    immediately), 503 when it waited longer than its timeout. Every successful
+    acquire must be paired with release(). max_inflight <= 0 disables it.
+    """
+    def __init__(self, classes, max_inflight=256, default_class=None):
+        self.max_inflight = max_inflight
+        self.enabled = max_inflight > 0
+        self.classes = [PriorityClass(*c) for c in classes]
+        self.by_name = {c.name: c for c in self.classes}
+        self.default_class = default_class if default_class in self.by_name else self.classes[0].name
+        self.inflight = 0
+
+    def resolve(self, name):
+        return name if name in self.by_name else self.default_class
+
+    def depth(self, name):
+        return len(self.by_name[name].waiters)
+
+    def _limit(self, c):
+        return max(1, int(self.max_inflight * c.share))
+
+    def _queued_ahead(self, c):
+        # anyone of equal or higher priority already waiting goes first
+        for other in self.classes:
+            if other.waiters:
+                return True
+            if other is c:
+                return False
+        return False
+
+    async def acquire(self, name, timeout):
+        if not self.enabled:
+            return
+        c = self.by_name[self.resolve(name)]
+        if self.inflight < self._limit(c) and not self._queued_ahead(c):
+            self.inflight += 1
+            return
+        if len(c.waiters) >= c.queue_size:
+            raise AdmissionRejected(c.name, 'queue_full', 429)
+        fut = asyncio.get_running_loop().create_future()
+        c.waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            self._abandon(c, fut)
+            raise AdmissionRejected(c.name, 'timeout', 503) from None
+        except asyncio.CancelledError:
+            self._abandon(c, fut)
+            raise
+
+    def _abandon(self, c, fut):
+        if fut.done() and not fut.cancelled():
+            self.release()  # we were let in just as we gave up: hand the slot on
+            return
+        fut.cancel()
+        try:
+            c.waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def release(self):
+        if not self.enabled:
+            return
+        self.inflight -= 1
+        # strict priority: serve the highest class that has waiters and room under its share
+        for c in self.classes:
+            while c.waiters and self.inflight < self._limit(c):
+                fut = c.waiters.popleft()
+                if not fut.done():
+                    self.inflight += 1
+                    fut.set_result(None)
+            if c.waiters:
+                return  # a higher class is still waiting; don't let lower ones overtake it
@@ -0,0 +1,613 @@
+# routing/app.py
+# The router: picks a backend with the configured policy and forwards /predict to it.
+import asyncio
+import logging
+import os
+import time
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from manager_client import ManagerClient
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+                               CONTENT_TYPE_LATEST)
+
+from . import config
+from .admission import AdmissionController, AdmissionRejected, parse_classes
+from .batching import MicroBatcher
+from .breaker import BreakerSet
+from .cache import MISS, ResponseCache, fingerprint
+from .deadline import DEADLINE_HEADER, EXPIRED_HEADER, DeadlineExceeded, parse_budget_ms
+from .fastpath import FastPath
+from .limits import ConcurrencyLimits
+from .policies import make_policy
+from .pool import BackendPool
+from .reporter import SampleReporter
+from .retry import RetryBudget
+from .shm import SharedTable
+from .stats import BackendStats
+from .weights import WeightTable
+
+app = FastAPI()
+log = logging.getLogger(__name__)
+
+PRIORITY_HEADER = 'x-priority'
+
+# Prometheus metrics
+REQ_LATENCY = Histogram('aegis_router_request_latency_ms', 'Request latency in milliseconds', ['endpoint'])
+REQ_COUNT = Counter('aegis_router_requests_total', 'Total requests', ['endpoint', 'status'])
+CACHE_HITS = Counter('aegis_router_cache_hits_total', 'Requests answered from the response cache')
+CACHE_MISSES = Counter('aegis_router_cache_misses_total', 'Requests sent upstream after a cache miss')
+CACHE_COALESCED = Counter('aegis_router_cache_coalesced_total', 'Requests that waited for an identical request already upstream')
+CACHE_ENTRIES = Gauge('aegis_router_cache_entries', 'Entries in the response cache', multiprocess_mode='livesum')
+BREAKER_STATE = Gauge('aegis_router_breaker_state', 'Circuit breaker state per backend (0=closed, 1=open, 2=half-open)', ['backend'], multiprocess_mode='livemax')
+RETRIES = Counter('aegis_router_retries_total', 'Retries sent to a different backend')
+RETRIES_DENIED = Counter('aegis_router_retries_denied_total', 'Failed attempts that were not retried', ['reason'])
+DEADLINE_SHED = Counter('aegis_router_deadline_shed_total', 'Requests dropped because their deadline could not be met', ['stage'])
+HEDGES_SENT = Counter('aegis_router_hedges_total', 'Hedged (duplicate) requests sent')
+HEDGES_WON = Counter('aegis_router_hedges_won_total', 'Hedged requests that answered before the original')
+BACKEND_CHOSEN = Counter('router_backend_chosen_total', 'Which backend chosen', ['backend'])
+BACKEND_INFLIGHT = Gauge('aegis_router_backend_inflight', 'Requests in flight per backend', ['backend'], multiprocess_mode='livesum')
+ROUTER_QUEUE = Gauge('router_queue_depth', 'Requests waiting for a backend with a free concurrency slot', multiprocess_mode='livesum')
+CONCURRENCY_LIMIT = Gauge('aegis_router_concurrency_limit', 'Adaptive concurrency limit per backend', ['backend'], multiprocess_mode='livesum')
+LIMIT_REJECTED = Counter('aegis_router_limit_rejected_total', 'Requests rejected because every backend was at its concurrency limit')
+ADMISSION_QUEUE = Gauge('aegis_router_admission_queue_depth', 'Requests waiting for admission per priority class', ['class'], multiprocess_mode='livesum')
+ADMISSION_INFLIGHT = Gauge('aegis_router_admission_inflight', 'Requests admitted and not yet finished', multiprocess_mode='livesum')
+ADMISSION_REJECTED = Counter('aegis_router_admission_rejected_total', 'Requests shed by admission control', ['class', 'reason'])
+BATCH_SIZE = Histogram('aegis_router_batch_size', 'Items per batch call sent upstream', ['reason'],
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+WEIGHTS_AGE = Gauge('aegis_router_weights_age_seconds', 'Seconds since the last good weights refresh (-1 = never)', multiprocess_mode='livemax')
+REPORTED_SAMPLES = Counter('aegis_router_reported_samples_total', 'Latency samples reported to the manager', ['outcome'])
+WEIGHTS_REFRESH_FAILURES = Counter('aegis_router_weights_refresh_failures_total', 'Failed weight refreshes from the manager')
+
+def _weights_age():
+    weights = getattr(app.state, 'weights', None)
+    age = weights.age() if weights else None
+    return -1.0 if age is None else age
+
+# several workers (PROMETHEUS_MULTIPROC_DIR set): every process writes its samples to mmap files
+# there and /metrics aggregates them. Gauges computed on scrape (set_function) can't be read from
+# another process, so in that mode they are sampled into the files once a second instead.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+_FUNCTION_GAUGES = []
+
+def _gauge_function(gauge, fn):
+    if MULTIPROCESS:
+        _FUNCTION_GAUGES.append((gauge, fn))
+    else:
+        gauge.set_function(fn)
+
+async def _sample_function_gauges():
+    while True:
+        for gauge, fn in _FUNCTION_GAUGES:
+            gauge.set(fn())
+        await asyncio.sleep(1.0)
+
+_gauge_function(WEIGHTS_AGE, _weights_age)
+
+POLICY = make_policy(config.ROUTER_POLICY)
+STATS = BackendStats()
+BREAKERS = BreakerSet(
+    on_change=lambda name, state: BREAKER_STATE.labels(backend=name).set(state),
+    failures=config.BREAKER_FAILURES,
+    error_rate=config.BREAKER_ERROR_RATE,
+    window=config.BREAKER_WINDOW,
+    min_calls=config.BREAKER_MIN_CALLS,
+    open_s=config.BREAKER_OPEN_S,
+    trials=config.BREAKER_TRIALS,
+)
+RETRY_BUDGET = RetryBudget(ratio=config.RETRY_BUDGET_RATIO, min_per_s=config.RETRY_BUDGET_MIN_PER_S)
+# same token-bucket shape caps the hedge rate; no time-based floor, and it starts empty so
+# hedges stay within HEDGE_MAX_RATE of the requests seen from the very first one
+HEDGE_BUDGET = RetryBudget(ratio=config.HEDGE_MAX_RATE, min_per_s=0.0, initial_tokens=0.0)
+# only successful backend answers are cached and shared with coalesced requests; an error or shed
+# response (504 for the leader's deadline, 429 for its class) is the leader's alone
+CACHE = ResponseCache(
+    ttl_s=config.CACHE_TTL_S,
+    max_entries=config.CACHE_MAX_ENTRIES,
+    cacheable=lambda result: isinstance(result, dict) and 'error' not in result,
+)
+_gauge_function(CACHE_ENTRIES, lambda: len(CACHE.entries))
+# pass upstream bytes straight through; the cache and batching need the parsed body, so they win
+STREAM_PROXY = config.PROXY_MODE == 'stream' and not CACHE.enabled and not config.BATCH_ENABLED
+# plus date and server, which uvicorn sets on every response itself: relaying them would duplicate both
+HOP_BY_HOP = {b'connection', b'keep-alive', b'proxy-authenticate', b'proxy-authorization', b'te', b'trailer',
+              b'transfer-encoding', b'upgrade', b'date', b'server'}
+CACHE_OUTCOMES = {'hit': CACHE_HITS, 'miss': CACHE_MISSES, 'coalesced': CACHE_COALESCED}
+ADMISSION = AdmissionController(
+    parse_classes(config.ADMISSION_CLASSES),
+    max_inflight=config.ADMISSION_MAX_INFLIGHT,
+    default_class=config.ADMISSION_DEFAULT_CLASS,
+)
+for _cls in ADMISSION.by_name:
+    _gauge_function(ADMISSION_QUEUE.labels(**{'class': _cls}), lambda name=_cls: ADMISSION.depth(name))
+_gauge_function(ADMISSION_INFLIGHT, lambda: ADMISSION.inflight)
+LIMITS = ConcurrencyLimits(
+    algorithm=config.LIMIT_ALGORITHM,
+    on_change=lambda name, limit: CONCURRENCY_LIMIT.labels(backend=name).set(limit),
+    initial=config.LIMIT_INITIAL,
+    min_limit=config.LIMIT_MIN,
+    max_limit=config.LIMIT_MAX,
+)
+
+@app.on_event('startup')
+async def startup():
+    app.state.pool = BackendPool(
+        dict(config.BACKEND_URLS),
+        max_connections=config.POOL_MAX_CONNECTIONS,
+        max_keepalive=config.POOL_MAX_KEEPALIVE,
+        keepalive_expiry=config.POOL_KEEPALIVE_EXPIRY_S,
+        http2=config.POOL_HTTP2,
+        timeout=config.UPSTREAM_TIMEOUT_S,
+    )
+    app.state.batcher = MicroBatcher(
+        forward_batch,
+        max_items=config.BATCH_MAX_ITEMS,
+        max_wait_s=config.BATCH_MAX_WAIT_MS / 1000.0,
+        max_inflight=config.BATCH_MAX_INFLIGHT,
+        max_timeout_s=config.ATTEMPT_TIMEOUT_S,
+        on_flush=lambda backend, size, reason: BATCH_SIZE.labels(reason=reason).observe(size),
+    )
+    app.state.manager_client = ManagerClient(host=config.MANAGER_HOST, port=config.MANAGER_PORT)
+    subscribe = app.state.manager_client.subscribe_weights if config.WEIGHT_SOURCE == 'stream' else None
+    app.state.shared = None
+    if config.SHM_PATH:
+        # several workers: share weights and in-flight counts through one mmap'd table
+        app.state.shared = SharedTable(config.SHM_PATH, max_backends=config.SHM_MAX_BACKENDS,
+                                       max_workers=config.SHM_MAX_WORKERS)
+        app.state.shared.claim_worker()
+        STATS.shared = app.state.shared
+    app.state.weights = WeightTable(_fetch_weights, interval=config.WEIGHT_REFRESH_INTERVAL_S, subscribe=subscribe,
+                                    shared=app.state.shared)
+    app.state.weights.start()
+    app.state.reporter = None
+    if config.REPORT_ENABLED:
+        app.state.reporter = SampleReporter(
+            app.state.manager_client.record_batch,
+            max_samples=config.REPORT_MAX_SAMPLES,
+            flush_interval_s=config.REPORT_FLUSH_MS / 1000.0,
+            max_buffer=config.REPORT_MAX_BUFFER,
+            on_flush=_on_report,
+        )
+        app.state.reporter.start()
+    if MULTIPROCESS:
+        app.state.gauge_sampler = asyncio.create_task(_sample_function_gauges())
+
+def _on_report(sent, dropped):
+    if sent:
+        REPORTED_SAMPLES.labels(outcome='sent').inc(sent)
+    if dropped:
+        REPORTED_SAMPLES.labels(outcome='dropped').inc(dropped)
+
+async def _fetch_weights():
+    try:
+        return await app.state.manager_client.get_weights()
+    except Exception:
+        WEIGHTS_REFRESH_FAILURES.inc()
+        raise
+
+@app.on_event('shutdown')
+async def shutdown():
+    try:
+        await app.state.weights.stop()
+    except Exception:
+        pass
+    try:
+        await app.state.batcher.close()
+    except Exception:
+        pass
+    try:
+        await app.state.pool.close()
+    except Exception:
+        pass
+    try:
+        if app.state.reporter is not None:
+            await app.state.reporter.close()  # last flush, before the manager client goes
+    except Exception:
+        pass
+    try:
+        await app.state.manager_client.close()
+    except Exception:
+        pass
+    if app.state.shared is not None:
+        STATS.shared = None
+        app.state.shared.close()
+    if MULTIPROCESS:
+        app.state.gauge_sampler.cancel()
+        multiprocess.mark_process_dead(os.getpid())  # drop this worker's live gauges
+
+_routable_cache = (None, None, None)
+
+_backend_urls = None  # the pool's urls as of the last weights snapshot
+_backend_paths = {}  # registered backends that serve predictions somewhere other than BACKEND_PATH
+
+def _sync_backend_urls(weights):
+    # configured backends plus, with DYNAMIC_BACKENDS, those the manager lists with a url (and
+    # the path they registered, e.g. /infer for backend/app.py); a backend that drops out of
+    # the snapshot loses its pooled client, breaker, limit and stats
+    global _backend_urls, _backend_paths
+    urls = dict(config.BACKEND_URLS)
+    paths = {}
+    if config.DYNAMIC_BACKENDS:
+        for name, v in weights.items():
+            if name not in urls and v.get('url'):
+                urls[name] = v['url']
+                if v.get('path'):
+                    paths[name] = v['path']
+    _backend_paths = paths
+    if urls != _backend_urls:
+        for name in app.state.pool.set_urls(urls):
+            log.info('backend %s left or moved', name)
+        for name in set(_backend_urls or ()) - set(urls):
+            _forget(name)
+        _backend_urls = urls
+    return urls
+
+def _forget(name):
+    BREAKERS.remove(name)
+    LIMITS.remove(name)
+    STATS.remove(name)
+    for gauge in (BREAKER_STATE, CONCURRENCY_LIMIT):
+        try:
+            gauge.remove(name)
+        except KeyError:
+            pass
+
+def routable(weights):
+    # backends we have a URL for and whose breaker is closed; until the first weight refresh
+    # every configured backend counts as healthy. Cached per (weights snapshot, breaker
+    # generation): the same dict goes to the policy until either changes.
+    global _routable_cache
+    cached_for, generation, backends = _routable_cache
+    if weights is cached_for and generation == BREAKERS.generation:
+        return backends
+    if not weights:
+        weights_or_default = {name: {'weight': 1.0, 'healthy': 1} for name in config.BACKEND_URLS}
+    else:
+        weights_or_default = weights
+    urls = _sync_backend_urls(weights_or_default) if weights_or_default is weights else config.BACKEND_URLS
+    backends = {name: v for name, v in weights_or_default.items()
+                if name in urls and BREAKERS.is_closed(name)}
+    _routable_cache = (weights, BREAKERS.generation, backends)
+    return backends
+
+def _has_capacity(name):
+    # in flight from every worker when they share a table, so N workers don't each fill the limit
+    return LIMITS.has_capacity(name, STATS.outstanding(name))
+
+def _unused(backend):
+    # a pick that is not going to be forwarded: give back the half-open trial it may hold
+    if config.BREAKER_ENABLED:
+        BREAKERS.cancel(backend)
+
+def choose_backend(weights, exclude=()):
+    backends = routable(weights)
+    if config.BREAKER_ENABLED:
+        # reserved only if it isn't excluded: a dropped reservation would hold the breaker half-open
+        # forever; and only if we still have a url for it
+        known = _backend_urls if weights else config.BACKEND_URLS
+        trial = BREAKERS.take_trial(exclude, known)
+        if trial is not None:
+            return trial
+    if exclude:
+        # retries only: a fresh dict, so policies rebuild their derived tables for this pick
+        backends = {name: v for name, v in backends.items() if name not in exclude}
+    if not backends:
+        return None
+    backend = POLICY.select(backends, STATS)
+    if backend is None or _has_capacity(backend):
+        return backend
+    # the pick is at its concurrency limit: re-roll once, then narrow to backends with room
+    backend = POLICY.select(backends, STATS)
+    if backend is not None and _has_capacity(backend):
+        return backend
+    with_room = {name: v for name, v in backends.items() if _has_capacity(name)}
+    return POLICY.select(with_room, STATS) if with_room else None
+
+async def choose_backend_or_wait(weights, exclude, deadline):
+    # like choose_backend, but if every backend is merely full, queue briefly for a free slot
+    backend = choose_backend(weights, exclude)
+    if backend is not None or not LIMITS.enabled:
+        return backend
+    if not any(name not in exclude for name in routable(weights)):
+        return None  # nothing routable at all; waiting won't help
+    wait_until = min(deadline, time.perf_counter() + config.LIMIT_QUEUE_TIMEOUT_S)
+    # only this worker's releases wake us; with a shared table other workers free slots too, so poll
+    poll_s = 0.01 if STATS.shared is not None else None
+    ROUTER_QUEUE.inc()
+    try:
+        while backend is None:
+            remaining = wait_until - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(LIMITS.wait_for_slot(), min(remaining, poll_s or remaining))
+            except asyncio.TimeoutError:
+                if poll_s is None:
+                    break
+            backend = choose_backend(weights, exclude)
+    finally:
+        ROUTER_QUEUE.dec()
+    if backend is None:
+        LIMIT_REJECTED.inc()
+    return backend
+
+def _too_late(backend, deadline):
+    # would this backend, at its usual latency, answer after the caller has given up?
+    remaining_ms = (deadline - time.perf_counter()) * 1000.0
+    expected_ms = STATS.ewma_ms.get(backend) or 0.0
+    return remaining_ms <= 0 or remaining_ms < expected_ms * config.DEADLINE_SHED_RATIO
+
+def _pick_in_time(weights, backend, deadline):
+    # the first pick, or another routable backend whose usual latency fits the caller's budget;
+    # None if none does. A half-open trial goes ahead: its ewma still carries the failures that
+    # opened the breaker, and shedding every trial would keep the breaker from ever closing.
+    if deadline <= time.perf_counter():
+        _unused(backend)
+        return None
+    slow = []
+    while backend is not None and BREAKERS.is_closed(backend) and _too_late(backend, deadline):
+        slow.append(backend)
+        backend = choose_backend(weights, exclude=slow)
+    return backend
+
+async def forward(backend, timeout, items=None):
+    # one upstream attempt (a batch call when `items` is given); transport errors and 5xx
+    # raise and count against the backend, and so does each item of a batch the backend failed.
+    # The backend gets our attempt timeout as its deadline budget.
+    # With STREAM_PROXY the response comes back unread (latency is time to headers) and the
+    # caller owns closing it.
+    BACKEND_CHOSEN.labels(backend=backend).inc()
+    BACKEND_INFLIGHT.labels(backend=backend).inc()
+    ok = None
+    outcomes = None  # per item, for a batch answer
+    status = 0  # 0 = no response (transport error or timeout)
+    t0 = time.perf_counter()
+    try:
+        with STATS.track(backend):
+            headers = {DEADLINE_HEADER: str(int(timeout * 1000))}
+            if items is None:
+                resp = await app.state.pool.get(backend, _backend_paths.get(backend, config.BACKEND_PATH),
+                                                timeout=timeout, headers=headers,
+                                                stream=STREAM_PROXY)
+            else:
+                path = _backend_paths[backend] + '/batch' if backend in _backend_paths else config.BATCH_PATH
+                resp = await app.state.pool.post(backend, path, timeout=timeout, headers=headers,
+                                                 json={'items': items})
+            status = resp.status_code
+            if resp.status_code >= 500:
+                await resp.aclose()
+                if resp.headers.get(EXPIRED_HEADER):
+                    raise DeadlineExceeded(f'{backend} skipped the request: deadline exceeded')
+                resp.raise_for_status()
+            if items is not None and resp.status_code < 400:
+                outcomes = [result.get('status_code', status) < 500 for result in resp.json()['results']]
+        ok = True
+        return resp
+    except (asyncio.CancelledError, DeadlineExceeded):
+        raise  # a hedge loser or an expired budget says nothing about the backend's health
+    except Exception:
+        ok = False
+        raise
+    finally:
+        BACKEND_INFLIGHT.labels(backend=backend).dec()
+        if ok is not None:
+            elapsed = time.perf_counter() - t0
+            LIMITS.on_sample(backend, elapsed * 1000.0, ok and all(outcomes or ()), STATS.outstanding(backend) + 1)
+            if app.state.reporter is not None:
+                app.state.reporter.add(backend, elapsed, status)
+        LIMITS.release()
+        if config.BREAKER_ENABLED:
+            if ok is None:
+                BREAKERS.cancel(backend)
+            else:
+                for item_ok in outcomes or (ok,):
+                    BREAKERS.record(backend, item_ok)
+
+async def forward_batch(backend, items, timeout):
+    # MicroBatcher.send: one batch call, split back into a response per item; an item the backend
+    # failed on its own carries a "status_code"
+    resp = await forward(backend, timeout, items=items)
+    resp.raise_for_status()
+    return [httpx.Response(result.get('status_code', resp.status_code), json=result, request=resp.request)
+            for result in resp.json()['results']]
+
+async def forward_hedged(backend, deadline, weights, tried):
+    # forward(), plus a second copy to another backend if the first is slower than its usual tail
+    timeout = min(config.ATTEMPT_TIMEOUT_S, deadline - time.perf_counter())
+    hedge_ms = STATS.quantile(backend, config.HEDGE_QUANTILE, config.HEDGE_MIN_SAMPLES)
+    if hedge_ms is None or hedge_ms / 1000.0 >= timeout:
+        return await forward(backend, timeout)
+    first = asyncio.ensure_future(forward(backend, timeout))
+    done, _ = await asyncio.wait({first}, timeout=hedge_ms / 1000.0)
+    if done:
+        return first.result()
+    other = choose_backend(weights, exclude=tried)
+    if other is None:
+        return await first
+    if not HEDGE_BUDGET.try_spend():
+        _unused(other)
+        return await first
+    tried.append(other)
+    HEDGES_SENT.inc()
+    second = asyncio.ensure_future(forward(other, min(config.ATTEMPT_TIMEOUT_S, deadline - time.perf_counter())))
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            if winners:
+                for task in winners[1:]:
+                    await task.result().aclose()  # both answered at once; release the unused one
+                if winners[0] is second:
+                    HEDGES_WON.inc()
+                return winners[0].result()
+        # both failed: surface the original attempt's error
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _relay(resp):
+    try:
+        async for chunk in resp.aiter_raw():
+            yield chunk
+    finally:
+        await resp.aclose()  # also when the client goes away mid-body
+
+def _passthrough(resp):
+    # the upstream status, headers and undecoded body bytes, without parsing them
+    out = StreamingResponse(_relay(resp), status_code=resp.status_code)
+    out.raw_headers = [(k.lower(), v) for k, v in resp.headers.raw if k.lower() not in HOP_BY_HOP]
+    return out
+
+def _retry_denied(attempts, deadline):
+    # reason the next retry is not allowed, or None
+    if attempts > config.RETRY_MAX:
+        return 'attempts'
+    if deadline - time.perf_counter() <= 0:
+        return 'deadline'
+    if not RETRY_BUDGET.try_spend():
+        return 'budget'
+    return None
+
+@app.get('/healthz')
+async def healthz():
+    REQ_COUNT.labels(endpoint='/healthz', status='200').inc()
+    weights = app.state.weights
+    age = weights.age()
+    return {
+        'status': 'ok',
+        'policy': config.ROUTER_POLICY,
+        'weights_age_s': None if age is None else round(age, 3),
+        'weights_backends': len(weights.get()),
+        'weights_streaming': weights.streaming(),
+        'weights_last_error': weights.last_error,
+    }
+
+@app.get('/metrics')
+async def metrics():
+    # Expose Prometheus metrics
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+
+def _deadline_response(endpoint, start, stage):
+    DEADLINE_SHED.labels(stage=stage).inc()
+    REQ_LATENCY.labels(endpoint=endpoint).observe((time.perf_counter() - start) * 1000.0)
+    REQ_COUNT.labels(endpoint=endpoint, status='504').inc()
+    return JSONResponse({'error': 'deadline exceeded'}, status_code=504)
+
+def _priority_class(path, headers):
+    return ADMISSION.resolve(headers.get(PRIORITY_HEADER) or config.ADMISSION_ROUTE_CLASSES.get(path))
+
+def _rejected_response(endpoint, start, e):
+    ADMISSION_REJECTED.labels(**{'class': e.cls, 'reason': e.reason}).inc()
+    REQ_LATENCY.labels(endpoint=endpoint).observe((time.perf_counter() - start) * 1000.0)
+    REQ_COUNT.labels(endpoint=endpoint, status=str(e.status)).inc()
+    return JSONResponse({'error': 'overloaded', 'class': e.cls}, status_code=e.status,
+                        headers={'Retry-After': str(config.ADMISSION_RETRY_AFTER_S)})
+
+PREDICT_ROUTES = ('/predict', '/predict/bulk')
+
+@app.get('/predict')
+@app.get('/predict/bulk')
+async def predict(request: Request):
+    return await handle_predict(request.url.path, request.headers, request.query_params.multi_items())
+
+async def handle_predict(path, headers, query_items):
+    # framework-free core of /predict, shared with the raw ASGI fast path (routing/fastpath.py).
+    # Returns a JSON-able dict or a ready Response.
+    start = time.perf_counter()
+    endpoint = path
+    budget_s = config.REQUEST_TIMEOUT_S
+    client_ms = parse_budget_ms(headers.get(DEADLINE_HEADER))
+    if client_ms is not None:
+        budget_s = min(budget_s, client_ms / 1000.0)
+    deadline = start + budget_s
+    cls = _priority_class(path, headers)
+    if not CACHE.enabled:
+        return await _admit(cls, query_items, endpoint, start, deadline)
+    key = fingerprint(config.BACKEND_PATH, query_items)
+    result, outcome = await CACHE.load(key, lambda: _admit(cls, query_items, endpoint, start, deadline))
+    CACHE_OUTCOMES[outcome].inc()
+    if outcome != MISS:
+        # the upstream call was counted by whoever made it
+        REQ_LATENCY.labels(endpoint=endpoint).observe((time.perf_counter() - start) * 1000.0)
+        status = result.status_code if isinstance(result, Response) else (500 if 'error' in result else 200)
+        REQ_COUNT.labels(endpoint=endpoint, status=str(status)).inc()
+    return result
+
+async def _admit(cls, query_items, endpoint, start, deadline):
+    try:
+        await ADMISSION.acquire(cls, min(config.ADMISSION_QUEUE_TIMEOUT_S, deadline - time.perf_counter()))
+    except AdmissionRejected as e:
+        return _rejected_response(endpoint, start, e)
+    try:
+        return await _predict(endpoint, start, deadline, dict(query_items))
+    finally:
+        ADMISSION.release()
+
+async def _predict(endpoint, start, deadline, item):
+    RETRY_BUDGET.deposit()
+    if config.HEDGE_ENABLED:
+        HEDGE_BUDGET.deposit()
+    try:
+        weights = app.state.weights.get()
+        tried = []
+        while True:
+            backend = await choose_backend_or_wait(weights, tried, deadline)
+            if not backend:
+                if tried:
+                    RETRIES_DENIED.labels(reason='no_backend').inc()
+                    raise last_error
+                REQ_COUNT.labels(endpoint=endpoint, status='503').inc()
+                return JSONResponse({'error': 'no backend available'}, status_code=503,
+                                    headers={'Retry-After': str(config.LIMIT_RETRY_AFTER_S)})
+            if not tried:
+                backend = _pick_in_time(weights, backend, deadline)
+                if backend is None:
+                    return _deadline_response(endpoint, start, 'admission')
+            tried.append(backend)
+            try:
+                if config.BATCH_ENABLED:
+                    resp = await app.state.batcher.submit(backend, item, deadline)
+                    if resp.status_code >= 500:
+                        resp.raise_for_status()  # the backend failed this item: retry it like a failed forward
+                elif config.HEDGE_ENABLED:
+                    resp = await forward_hedged(backend, deadline, weights, tried)
+                else:
+                    resp = await forward(backend, min(config.ATTEMPT_TIMEOUT_S, deadline - time.perf_counter()))
+                break
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                last_error = e
+                reason = _retry_denied(len(tried), deadline)
+                if reason:
+                    RETRIES_DENIED.labels(reason=reason).inc()
+                    raise
+                RETRIES.inc()
+        if resp.is_error:
+            await resp.aclose()
+            resp.raise_for_status()
+        result = _passthrough(resp) if STREAM_PROXY else resp.json()
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        REQ_LATENCY.labels(endpoint=endpoint).observe(latency_ms)
+        REQ_COUNT.labels(endpoint=endpoint, status=str(resp.status_code)).inc()
+        return result
+    except DeadlineExceeded:
+        return _deadline_response(endpoint, start, 'backend')
+    except Exception as e:
+        # a full traceback per failed request is expensive when a backend is down; opt in via DEBUG
+        log.warning('predict failed: %r', e, exc_info=log.isEnabledFor(logging.DEBUG))
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        REQ_LATENCY.labels(endpoint=endpoint).observe(latency_ms)
+        REQ_COUNT.labels(endpoint=endpoint, status='500').inc()
+        return {'error': str(e)}
+
+# what uvicorn serves: GET /predict short-circuited in front of FastAPI (FASTPATH=0 serves plain FastAPI)
+asgi = FastPath(app, PREDICT_ROUTES, handle_predict) if config.FASTPATH_ENABLED else app
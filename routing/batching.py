@@ -0,0 +1,91 @@
+# routing/batching.py
+# Dynamic micro-batching. Requests bound for the same backend are collected
+# until `max_items` are waiting or the oldest has waited `max_wait_s`, then
+# sent upstream as one batch call; the per-item results are handed back to
+# the waiting callers. While a backend already has `max_inflight` batches
+# outstanding, a timed-out batch keeps growing instead (up to max_items), so
+# batches get bigger exactly when the backend is busy.
+import asyncio
+import time
+
+class MicroBatcher:
+    """
+    send(backend, items, timeout) -> list of per-item results, same order.
+    If the batch call raises, every caller in the batch gets the exception
+    (and can retry elsewhere on its own). The batch timeout is the tightest
+    deadline among its items.
+    """
+    def __init__(self, send, max_items=16, max_wait_s=0.005, max_inflight=1, max_timeout_s=None, on_flush=None):
+        self.send = send
+        self.max_items = max_items
+        self.max_wait_s = max_wait_s
+        self.max_inflight = max_inflight  # batches outstanding per backend; 0 = unlimited
+        self.max_timeout_s = max_timeout_s
+        self.on_flush = on_flush  # on_flush(backend, size, reason)
+        self.pending = {}  # backend -> [(item, deadline, future)]
+        self.timers = {}
+        self.due = set()  # backends whose timer fired while they were busy
+        self.inflight = {}
+        self.tasks = set()
+
+    async def submit(self, backend, item, deadline):
+        fut = asyncio.get_running_loop().create_future()
+        batch = self.pending.setdefault(backend, [])
+        batch.append((item, deadline, fut))
+        if len(batch) >= self.max_items:
+            self._flush(backend, "full")
+        elif len(batch) == 1:
+            self.timers[backend] = asyncio.get_running_loop().call_later(
+                self.max_wait_s, self._on_timer, backend)
+        return await fut
+
+    def _on_timer(self, backend):
+        self.timers.pop(backend, None)
+        if self.max_inflight and self.inflight.get(backend, 0) >= self.max_inflight:
+            self.due.add(backend)  # flushed when one of the outstanding batches returns
+        else:
+            self._flush(backend, "timer")
+
+    def _flush(self, backend, reason):
+        timer = self.timers.pop(backend, None)
+        if timer is not None:
+            timer.cancel()
+        self.due.discard(backend)
+        batch = self.pending.pop(backend, None)
+        if not batch:
+            return
+        if self.on_flush:
+            self.on_flush(backend, len(batch), reason)
+        self.inflight[backend] = self.inflight.get(backend, 0) + 1
+        task = asyncio.ensure_future(self._run(backend, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        task.add_done_callback(lambda _: self._done(backend))
+
+    def _done(self, backend):
+        self.inflight[backend] -= 1
+        if backend in self.due:
+            self._flush(backend, "timer")
+
+    async def _run(self, backend, batch):
+        timeout = min(deadline for _, deadline, _ in batch) - time.perf_counter()
+        if self.max_timeout_s is not None:
+            timeout = min(timeout, self.max_timeout_s)
+        try:
+            results = await self.send(backend, [item for item, _, _ in batch], timeout)
+            if len(results) != len(batch):
+                raise ValueError(f'{backend} returned {len(results)} results for a batch of {len(batch)}')
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, _, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def close(self):
+        for backend in list(self.pending):
+            self._flush(backend, "close")
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
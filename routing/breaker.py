@@ -0,0 +1,149 @@
+# routing/breaker.py
+# Per-backend circuit breakers: stop sending traffic to a failing backend
+# long before the manager's health probe notices, then let a few trial
+# requests through to find out when it has recovered.
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", OPEN: "open", HALF_OPEN: "half_open"}
+
+class CircuitBreaker:
+    """
+    closed    -> open       after `failures` consecutive failures, or when the error
+                            rate over the last `window` calls reaches `error_rate`
+                            (once at least `min_calls` have been seen)
+    open      -> half_open  after `open_s` seconds
+    half_open -> closed     after `trials` successful trial calls
+    half_open -> open       on any trial failure
+    """
+    def __init__(self, failures=5, error_rate=0.5, window=20, min_calls=10, open_s=5.0, trials=1,
+                 clock=time.monotonic):
+        self.failures = failures
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.open_s = open_s
+        self.trials = trials
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive = 0
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.trials_started = 0
+        self.trials_passed = 0
+
+    def _set(self, state):
+        self.state = state
+        if state == OPEN:
+            self.opened_at = self.clock()
+        elif state == HALF_OPEN:
+            self.trials_started = self.trials_passed = 0
+        else:
+            self.consecutive = 0
+            self.outcomes.clear()
+
+    def poll(self):
+        # returns True if the breaker changed state (open -> half_open after the cool-off)
+        if self.state == OPEN and self.clock() - self.opened_at >= self.open_s:
+            self._set(HALF_OPEN)
+            return True
+        return False
+
+    def try_trial(self):
+        if self.state == HALF_OPEN and self.trials_started < self.trials:
+            self.trials_started += 1
+            return True
+        return False
+
+    def cancel(self):
+        # a call that ended without an outcome; give its trial slot back
+        if self.state == HALF_OPEN and self.trials_started > self.trials_passed:
+            self.trials_started -= 1
+
+    def record(self, ok):
+        # returns True if the breaker changed state
+        if self.state == HALF_OPEN:
+            if not ok:
+                self._set(OPEN)
+                return True
+            self.trials_passed += 1
+            if self.trials_passed >= self.trials:
+                self._set(CLOSED)
+                return True
+            return False
+        if self.state == OPEN:
+            return False  # a call that was already in flight when we tripped
+        self.outcomes.append(ok)
+        self.consecutive = 0 if ok else self.consecutive + 1
+        if self.consecutive >= self.failures:
+            self._set(OPEN)
+            return True
+        if len(self.outcomes) >= self.min_calls:
+            errors = len(self.outcomes) - sum(self.outcomes)
+            if errors / len(self.outcomes) >= self.error_rate:
+                self._set(OPEN)
+                return True
+        return False
+
+class BreakerSet:
+    """
+    Breakers for every backend, created on first use. `generation` changes
+    whenever any breaker changes state, so callers can cache the set of
+    closed backends and rebuild only then.
+    """
+    def __init__(self, on_change=None, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self.on_change = on_change  # on_change(name, state)
+        self.breakers = {}
+        self.not_closed = set()
+        self.generation = 0
+
+    def get(self, name):
+        b = self.breakers.get(name)
+        if b is None:
+            b = self.breakers[name] = CircuitBreaker(**self.breaker_kwargs)
+            if self.on_change:
+                self.on_change(name, CLOSED)
+        return b
+
+    def _changed(self, name, b):
+        self.generation += 1
+        if b.state == CLOSED:
+            self.not_closed.discard(name)
+        else:
+            self.not_closed.add(name)
+        if self.on_change:
+            self.on_change(name, b.state)
+
+    def is_closed(self, name):
+        return name not in self.not_closed
+
+    def take_trial(self, exclude=(), known=None):
+        """
+        Advance cooled-off breakers to half-open and return a backend that may
+        take one trial request now, or None. O(number of non-closed breakers).
+        The slot is reserved: the caller must forward to the backend (which
+        records or cancels it) or give it back with cancel(). Backends in
+        `exclude`, or missing from `known` when it is given, are never reserved.
+        """
+        for name in list(self.not_closed):
+            b = self.breakers[name]
+            if b.poll():
+                self._changed(name, b)
+            if name not in exclude and (known is None or name in known) and b.try_trial():
+                return name
+        return None
+
+    def remove(self, name):
+        # the backend left the fleet; a later call creates a fresh (closed) breaker
+        if self.breakers.pop(name, None) is not None and name in self.not_closed:
+            self.not_closed.discard(name)
+            self.generation += 1
+
+    def cancel(self, name):
+        self.get(name).cancel()
+
+    def record(self, name, ok):
+        b = self.get(name)
+        if b.record(ok):
+            self._changed(name, b)
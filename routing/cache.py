@@ -0,0 +1,80 @@
+# routing/cache.py
+# Optional response cache for /predict. Entries live for `ttl_s` and the
+# least recently used ones are evicted beyond `max_entries`. Identical
+# requests that arrive while one is already upstream wait for that one
+# instead of sending their own (singleflight).
+import asyncio
+import time
+from collections import OrderedDict
+
+HIT, MISS, COALESCED = "hit", "miss", "coalesced"
+_UNSHARED = object()  # what waiters get when the leader's value isn't cacheable
+
+def fingerprint(path, query_items):
+    # order of query parameters doesn't change the request
+    return (path, tuple(sorted(query_items)))
+
+class ResponseCache:
+    def __init__(self, ttl_s=1.0, max_entries=1024, cacheable=lambda value: True, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.enabled = ttl_s > 0 and max_entries > 0
+        self.cacheable = cacheable
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.inflight = {}  # key -> future of the request already upstream
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value):
+        self.entries[key] = (self.clock() + self.ttl_s, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def load(self, key, fetch):
+        """
+        Returns (value, HIT | MISS | COALESCED). On a miss `fetch()` is awaited
+        once for everyone asking for `key` meanwhile, and a value passing
+        `cacheable` is stored and handed to all of them. Anything else (an
+        error, a request shed for its own deadline or priority) stays the
+        leader's: each waiter then calls its own `fetch()`.
+        """
+        while True:
+            entry = self.get(key)
+            if entry is not None:
+                return entry[1], HIT
+            fut = self.inflight.get(key)
+            if fut is None:
+                break
+            try:
+                value = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise  # we were cancelled ourselves
+                continue  # the leader was cancelled; try again (one of us becomes the new leader)
+            if value is _UNSHARED:
+                return await fetch(), MISS
+            return value, COALESCED
+        fut = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fetch()
+        except BaseException:
+            fut.cancel()
+            raise
+        finally:
+            del self.inflight[key]
+        if self.cacheable(value):
+            self.put(key, value)
+            fut.set_result(value)
+        else:
+            fut.set_result(_UNSHARED)
+        return value, MISS
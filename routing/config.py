@@ -0,0 +1,117 @@
+# routing/config.py
+# Router settings, read from the environment once at startup.
+import os
+
+def _backend_urls(spec):
+    # "backend1=http://backend1:8101,backend2=http://backend2:8102" -> {"backend1": "http://backend1:8101", ...}
+    out = {}
+    for item in spec.split(","):
+        name, sep, url = item.strip().partition("=")
+        if sep and name and url:
+            out[name.strip()] = url.strip()
+    return out
+
+MANAGER_HOST = os.getenv("MANAGER_HOST", "manager")
+MANAGER_PORT = int(os.getenv("MANAGER_PORT", "8001"))
+
+BACKEND_URLS = _backend_urls(os.getenv(
+    "BACKEND_URLS",
+    "backend1=http://backend1:8101,backend2=http://backend2:8102,backend3=http://backend3:8103",
+))
+# also route to backends the manager lists with a "url" (ones that registered themselves with it);
+# they come and go with the weight snapshot, BACKEND_URLS entries are always kept
+DYNAMIC_BACKENDS = os.getenv("DYNAMIC_BACKENDS", "1") == "1"
+BACKEND_PATH = os.getenv("BACKEND_PATH", "/predict")  # backend.py serves /predict, backend/app.py /infer
+UPSTREAM_TIMEOUT_S = float(os.getenv("UPSTREAM_TIMEOUT_S", "10.0"))
+# serve GET /predict from a raw ASGI handler in front of FastAPI (routing/fastpath.py)
+FASTPATH_ENABLED = os.getenv("FASTPATH", "1") == "1"
+# parse: decode the backend's JSON and re-serialize it; stream: relay status, headers and body bytes as-is
+PROXY_MODE = os.getenv("PROXY_MODE", "parse")
+
+# micro-batching: collect up to BATCH_MAX_ITEMS requests per backend for at most BATCH_MAX_WAIT_MS
+# and send them as one POST {"items": [...]} to BATCH_PATH. Hedging is skipped while batching.
+BATCH_ENABLED = os.getenv("BATCH_ENABLED", "0") == "1"
+BATCH_PATH = os.getenv("BATCH_PATH", BACKEND_PATH + "/batch")
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_INFLIGHT = int(os.getenv("BATCH_MAX_INFLIGHT", "1"))  # outstanding batches per backend; 0 = unlimited
+
+# retries go to a different backend, within the overall deadline and the retry budget
+RETRY_MAX = int(os.getenv("RETRY_MAX", "2"))
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", str(UPSTREAM_TIMEOUT_S)))  # whole request, all attempts
+ATTEMPT_TIMEOUT_S = float(os.getenv("ATTEMPT_TIMEOUT_S", str(REQUEST_TIMEOUT_S / (RETRY_MAX + 1))))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))  # retries <= 10% of requests
+RETRY_BUDGET_MIN_PER_S = float(os.getenv("RETRY_BUDGET_MIN_PER_S", "1.0"))
+
+# shed at admission when what's left of the client's x-deadline-ms budget is below
+# DEADLINE_SHED_RATIO x the usual latency of every routable backend (a slow pick is swapped
+# for one that fits; a half-open breaker's trial is never shed)
+DEADLINE_SHED_RATIO = float(os.getenv("DEADLINE_SHED_RATIO", "1.0"))
+
+# admission control: at most ADMISSION_MAX_INFLIGHT requests in the router at once (0 = off),
+# the rest queue per priority class. ADMISSION_CLASSES is "name:queue_size:share,...",
+# highest priority first; a class may only fill `share` of the in-flight slots.
+# The class comes from the x-priority header, else from the route (GET /predict/bulk is the
+# low-priority alias of /predict; /predict/batch is the backends' micro-batch endpoint).
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "256"))
+ADMISSION_CLASSES = os.getenv("ADMISSION_CLASSES", "interactive:100:1.0,batch:50:0.7")
+ADMISSION_DEFAULT_CLASS = os.getenv("ADMISSION_DEFAULT_CLASS", "interactive")
+ADMISSION_ROUTE_CLASSES = dict(
+    item.strip().split("=", 1)
+    for item in os.getenv("ADMISSION_ROUTE_CLASSES", "/predict/bulk=batch").split(",") if "=" in item
+)
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "1.0"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "1"))
+
+# response cache for /predict (0 = off); concurrent identical requests share one upstream call
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "0"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# hedging: if the first backend hasn't answered by its live HEDGE_QUANTILE latency,
+# send a copy to another backend and take whichever answers first
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # no hedging until the quantile means something
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.05"))  # hedges <= 5% of requests
+
+# adaptive per-backend concurrency limits: gradient | aimd | none
+LIMIT_ALGORITHM = os.getenv("LIMIT_ALGORITHM", "gradient")
+LIMIT_INITIAL = int(os.getenv("LIMIT_INITIAL", "20"))
+LIMIT_MIN = int(os.getenv("LIMIT_MIN", "1"))
+LIMIT_MAX = int(os.getenv("LIMIT_MAX", "500"))
+# how long a request may wait for a free slot before it gets a 503; by default as long as its own
+# deadline allows, so a burst against healthy backends queues here instead of being shed
+LIMIT_QUEUE_TIMEOUT_S = float(os.getenv("LIMIT_QUEUE_TIMEOUT_S", str(REQUEST_TIMEOUT_S)))
+LIMIT_RETRY_AFTER_S = int(os.getenv("LIMIT_RETRY_AFTER_S", "1"))  # Retry-After on "no backend available"
+
+# first_healthy | ewma | weighted | least_outstanding | p2c | package.module:Class
+ROUTER_POLICY = os.getenv("ROUTER_POLICY", "p2c")
+
+WEIGHT_SOURCE = os.getenv("WEIGHT_SOURCE", "poll")  # poll | stream (GET /weights/stream, polling as fallback)
+WEIGHT_REFRESH_INTERVAL_S = float(os.getenv("WEIGHT_REFRESH_INTERVAL_S", "1.0"))
+
+# report every upstream attempt's latency to the manager (POST /record/batch), buffered and
+# sent when REPORT_MAX_SAMPLES are waiting or every REPORT_FLUSH_MS; at most REPORT_MAX_BUFFER kept
+REPORT_ENABLED = os.getenv("REPORT_ENABLED", "0") == "1"
+REPORT_MAX_SAMPLES = int(os.getenv("REPORT_MAX_SAMPLES", "2000"))
+REPORT_FLUSH_MS = float(os.getenv("REPORT_FLUSH_MS", "500"))
+REPORT_MAX_BUFFER = int(os.getenv("REPORT_MAX_BUFFER", "50000"))
+
+# multi-worker router (uvicorn --workers N): path of the shared weights / in-flight table, e.g.
+# /dev/shm/aegis-router; empty = single process. Pair it with PROMETHEUS_MULTIPROC_DIR for /metrics.
+SHM_PATH = os.getenv("ROUTER_SHM_PATH", "")
+SHM_MAX_BACKENDS = int(os.getenv("ROUTER_SHM_MAX_BACKENDS", "256"))
+SHM_MAX_WORKERS = int(os.getenv("ROUTER_SHM_MAX_WORKERS", "64"))
+
+POOL_MAX_CONNECTIONS = int(os.getenv("ROUTER_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("ROUTER_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY_S = float(os.getenv("ROUTER_POOL_KEEPALIVE_EXPIRY_S", "30"))
+POOL_HTTP2 = os.getenv("ROUTER_HTTP2", "0") == "1"
+
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "1") == "1"
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))  # consecutive failures that trip it
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))  # ...or this error rate over the window
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_OPEN_S = float(os.getenv("BREAKER_OPEN_S", "5.0"))
+BREAKER_TRIALS = int(os.getenv("BREAKER_TRIALS", "1"))  # half-open trial calls that must succeed to close
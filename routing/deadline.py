@@ -0,0 +1,20 @@
+# routing/deadline.py
+# Deadline propagation. Clients send their remaining budget in milliseconds
+# (relative, so clock skew doesn't matter); every hop forwards what is left
+# of it, and a backend that can't finish in time answers 504 + EXPIRED_HEADER
+# instead of doing work nobody will wait for.
+DEADLINE_HEADER = "x-deadline-ms"
+EXPIRED_HEADER = "x-deadline-exceeded"
+
+class DeadlineExceeded(Exception):
+    pass
+
+def parse_budget_ms(value):
+    # header value -> budget in ms, or None if absent/garbage
+    if value is None:
+        return None
+    try:
+        ms = float(value)
+    except ValueError:
+        return None
+    return ms if ms == ms else None  # NaN
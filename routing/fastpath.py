@@ -0,0 +1,40 @@
+# routing/fastpath.py
+# Raw-ASGI fast path for the hot route. GET /predict never touches FastAPI's
+# routing, dependency resolution or response serialization: the request is
+# handed to the same handler the FastAPI route uses and the result is
+# written straight to the ASGI `send`. Everything else (/metrics, /healthz,
+# the docs, lifespan startup/shutdown) goes to the wrapped FastAPI app.
+import json
+from urllib.parse import parse_qsl
+
+class FastPath:
+    """
+    handler(path, headers, query_items) -> dict (sent as 200 JSON) or a
+    Starlette Response, which is an ASGI app itself and sends itself.
+    """
+    def __init__(self, app, routes, handler):
+        self.app = app
+        self.routes = frozenset(routes)
+        self.handler = handler
+
+    def __getattr__(self, name):
+        # app.state, app.router, ... still reach the wrapped app
+        return getattr(self.app, name)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.routes or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        # ASGI header names are already lower-case
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        query = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        result = await self.handler(scope["path"], headers, query)
+        if isinstance(result, dict):
+            body = json.dumps(result, separators=(",", ":")).encode()
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+        else:
+            await result(scope, receive, send)
@@ -0,0 +1,112 @@
+# routing/limits.py
+# Adaptive per-backend concurrency limits. Each backend gets a limit on requests
+# in flight that moves with the RTTs we observe: it grows while latency stays
+# flat and shrinks as soon as the backend starts queueing, so an overloaded
+# backend sheds work to its peers instead of building an unbounded queue.
+import asyncio
+import math
+
+class AIMDLimit:
+    """
+    Additive increase / multiplicative decrease. +1 per successful sample while
+    the limit is actually being used; x`backoff` on an error or an RTT above
+    `rtt_tolerance` times the best RTT seen recently.
+    """
+    def __init__(self, initial=20, min_limit=1, max_limit=500, backoff=0.9, rtt_tolerance=2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.rtt_tolerance = rtt_tolerance
+        self.min_rtt = None
+
+    def update(self, rtt_ms, ok, inflight):
+        # let the baseline drift up slowly so a permanently slower backend isn't punished forever
+        self.min_rtt = rtt_ms if self.min_rtt is None else min(self.min_rtt * 1.001, rtt_ms)
+        if not ok or rtt_ms > self.rtt_tolerance * self.min_rtt:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif inflight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1.0)
+        return self.limit
+
+class GradientLimit:
+    """
+    Gradient/Vegas-style: compare each RTT with the no-load RTT (the best seen
+    recently). gradient = clamp(tolerance * min_rtt / rtt, 0.5, 1.0); the new
+    limit is limit * gradient + sqrt(limit) (room to probe upwards), smoothed.
+    Queueing shows up as RTT growth long before errors do.
+    """
+    def __init__(self, initial=20, min_limit=1, max_limit=500, smoothing=0.2, rtt_tolerance=1.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.rtt_tolerance = rtt_tolerance
+        self.min_rtt = None
+
+    def update(self, rtt_ms, ok, inflight):
+        rtt_ms = max(rtt_ms, 0.001)
+        # let the baseline drift up slowly so a permanently slower backend isn't punished forever
+        self.min_rtt = rtt_ms if self.min_rtt is None else min(self.min_rtt * 1.001, rtt_ms)
+        if ok and inflight < self.limit / 2:
+            return self.limit  # not using the limit, so the RTT says nothing about it
+        if ok:
+            gradient = max(0.5, min(1.0, self.rtt_tolerance * self.min_rtt / rtt_ms))
+        else:
+            gradient = 0.5
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = (1 - self.smoothing) * self.limit + self.smoothing * new_limit
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+        return self.limit
+
+ALGORITHMS = {"aimd": AIMDLimit, "gradient": GradientLimit}
+
+class ConcurrencyLimits:
+    """
+    One limit per backend (created on first use) plus a wake-up signal for
+    requests waiting for any backend to free a slot.
+    """
+    def __init__(self, algorithm="gradient", on_change=None, **limit_kwargs):
+        self.algorithm = algorithm
+        self.enabled = algorithm in ALGORITHMS
+        self.limit_kwargs = limit_kwargs
+        self.on_change = on_change  # on_change(name, limit)
+        self.limits = {}
+        self._freed = None
+
+    def _get(self, name):
+        lim = self.limits.get(name)
+        if lim is None:
+            lim = self.limits[name] = ALGORITHMS[self.algorithm](**self.limit_kwargs)
+            if self.on_change:
+                self.on_change(name, lim.limit)
+        return lim
+
+    def limit(self, name):
+        return int(self._get(name).limit) if self.enabled else None
+
+    def has_capacity(self, name, inflight):
+        return not self.enabled or inflight < max(1, int(self._get(name).limit))
+
+    def on_sample(self, name, rtt_ms, ok, inflight):
+        if not self.enabled:
+            return
+        lim = self._get(name)
+        before = int(lim.limit)
+        after = int(lim.update(rtt_ms, ok, inflight))
+        if self.on_change and after != before:
+            self.on_change(name, after)
+
+    def remove(self, name):
+        self.limits.pop(name, None)
+
+    def release(self):
+        # a request finished somewhere; wake everyone waiting for a slot
+        if self._freed is not None:
+            self._freed.set()
+            self._freed = None
+
+    async def wait_for_slot(self):
+        if self._freed is None:
+            self._freed = asyncio.Event()
+        await self._freed.wait()
@@ -0,0 +1,113 @@
+# routing/policies.py
+# Balancing policies. A policy is anything with select(backends, stats) -> name:
+#   backends: {name: {"weight", "healthy", ...}} for every backend the router can reach
+#   stats:    routing.stats.BackendStats with this router's in-flight/latency view
+# Return None when no backend should take the request.
+# The router passes the same backends dict until its weights change, so policies
+# can cache anything derived from it (see Policy._derived).
+import importlib
+import random
+
+from .selection import AliasTable
+
+POLICIES = {}
+
+def register_policy(cls):
+    POLICIES[cls.name] = cls
+    return cls
+
+def make_policy(name, **kwargs):
+    """
+    Build a policy by registered name, or from "package.module:ClassName"
+    so out-of-tree policies can be A/B tested without touching the router.
+    """
+    if ":" in name:
+        module, _, attr = name.partition(":")
+        return getattr(importlib.import_module(module), attr)(**kwargs)
+    try:
+        cls = POLICIES[name]
+    except KeyError:
+        raise ValueError(f"unknown routing policy {name!r} (known: {', '.join(sorted(POLICIES))})")
+    return cls(**kwargs)
+
+def healthy(backends):
+    return [n for n, v in backends.items() if v.get("healthy", 1)]
+
+class Policy:
+    name = None
+    _derived_for = None
+    _derived_value = None
+
+    def select(self, backends, stats):
+        raise NotImplementedError
+
+    def _derived(self, backends, build):
+        # rebuild only when the router hands us a new backends dict (i.e. weights changed)
+        if backends is not self._derived_for:
+            self._derived_value = build(backends)
+            self._derived_for = backends
+        return self._derived_value
+
+@register_policy
+class FirstHealthy(Policy):
+    name = "first_healthy"
+
+    def select(self, backends, stats):
+        names = self._derived(backends, healthy)
+        return names[0] if names else None
+
+@register_policy
+class InverseEwma(Policy):
+    # roulette over 1/ewma_ms from the manager; unhealthy backends keep a sliver of traffic
+    name = "ewma"
+
+    @staticmethod
+    def _table(backends):
+        invs = [(1.0 / (v.get("ewma_ms") or 1000.0)) if v.get("healthy", 1) == 1 else 0.0001
+                for v in backends.values()]
+        return AliasTable(backends.keys(), invs)
+
+    def select(self, backends, stats):
+        return self._derived(backends, self._table).pick()
+
+@register_policy
+class Weighted(Policy):
+    # weighted pick over the manager's weights (manager.py scores or manual overrides)
+    name = "weighted"
+
+    @staticmethod
+    def _table(backends):
+        names = healthy(backends)
+        return AliasTable(names, [backends[n].get("weight", 1.0) for n in names])
+
+    def select(self, backends, stats):
+        return self._derived(backends, self._table).pick()
+
+@register_policy
+class LeastOutstanding(Policy):
+    name = "least_outstanding"
+
+    def select(self, backends, stats):
+        best, best_cost = [], None
+        for n in healthy(backends):
+            c = stats.cost(n)
+            if best_cost is None or c < best_cost:
+                best, best_cost = [n], c
+            elif c == best_cost:
+                best.append(n)
+        return random.choice(best) if best else None
+
+@register_policy
+class PowerOfTwoChoices(Policy):
+    # near least-outstanding quality, O(1) per pick, and no herding onto a
+    # single "best" backend across router replicas
+    name = "p2c"
+
+    def select(self, backends, stats):
+        names = self._derived(backends, healthy)
+        if not names:
+            return None
+        if len(names) == 1:
+            return names[0]
+        a, b = random.sample(names, 2)
+        return a if stats.cost(a) <= stats.cost(b) else b
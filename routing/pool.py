@@ -0,0 +1,91 @@
+# routing/pool.py
+import asyncio
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+POOL_IN_USE = Gauge("router_pool_in_use", "Upstream requests currently holding a pooled connection", ["backend"],
+                    multiprocess_mode="livesum")
+POOL_MAX = Gauge("router_pool_max_connections", "Configured max connections per backend pool", multiprocess_mode="livesum")
+POOL_REQUESTS = Counter("router_pool_requests_total", "Upstream requests sent through the pool", ["backend"])
+POOL_OPENED = Counter("router_pool_connections_opened_total", "New upstream connections opened", ["backend"])
+POOL_REUSE = Gauge("router_pool_reuse_ratio", "Share of upstream requests served on a reused connection", ["backend"],
+                   multiprocess_mode="liveall")
+
+class BackendPool:
+    """
+    One long-lived httpx client per backend, so forwarded calls reuse
+    keep-alive connections instead of opening a new one per request.
+    Clients are created on first use from the urls mapping; set_urls()
+    swaps the mapping when backends join, leave or move.
+    """
+    def __init__(self, urls, max_connections=100, max_keepalive=20, keepalive_expiry=30.0,
+                 http2=False, timeout=10.0):
+        self.urls = urls
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.http2 = http2  # needs the h2 package (httpx[http2])
+        self.timeout = timeout
+        self.clients = {}
+        self.requests = {}
+        self.opened = {}
+        self._tracers = {}
+        POOL_MAX.set(max_connections)
+
+    def _client(self, name):
+        client = self.clients.get(name)
+        if client is None:
+            client = httpx.AsyncClient(base_url=self.urls[name], limits=self.limits, http2=self.http2,
+                                       timeout=self.timeout)
+            self.clients[name] = client
+            self.requests[name] = 0
+            self.opened[name] = 0
+            self._tracers[name] = self._make_tracer(name)
+        return client
+
+    def _make_tracer(self, name):
+        # httpcore only emits connect_tcp events when it has to open a new connection
+        async def trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                self.opened[name] += 1
+                POOL_OPENED.labels(name).inc()
+        return trace
+
+    async def get(self, name, path, **kwargs):
+        return await self.request(name, "GET", path, **kwargs)
+
+    async def post(self, name, path, **kwargs):
+        return await self.request(name, "POST", path, **kwargs)
+
+    async def request(self, name, method, path, stream=False, **kwargs):
+        # stream=True returns as soon as the headers are in; the caller must read or aclose() the body
+        client = self._client(name)
+        POOL_IN_USE.labels(name).inc()
+        try:
+            request = client.build_request(method, path, extensions={"trace": self._tracers[name]}, **kwargs)
+            return await client.send(request, stream=stream)
+        finally:
+            POOL_IN_USE.labels(name).dec()
+            self.requests[name] += 1
+            POOL_REQUESTS.labels(name).inc()
+            POOL_REUSE.labels(name).set(1.0 - min(self.opened[name], self.requests[name]) / self.requests[name])
+
+    def set_urls(self, urls, drain_s=None):
+        # clients of backends that left or changed url are closed after drain_s (the request
+        # timeout by default), so requests already on them can finish
+        stale = [name for name, url in self.urls.items() if urls.get(name) != url]
+        self.urls = dict(urls)
+        closing = [self.clients.pop(name) for name in stale if name in self.clients]
+        if closing:
+            asyncio.get_running_loop().create_task(self._close_later(closing, self.timeout if drain_s is None else drain_s))
+        return stale
+
+    async def _close_later(self, clients, delay):
+        await asyncio.sleep(delay)
+        for client in clients:
+            await client.aclose()
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
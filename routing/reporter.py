@@ -0,0 +1,82 @@
+# routing/reporter.py
+# Buffered latency reporting to the manager. Every finished upstream attempt
+# is appended to an in-memory buffer (no I/O on the request path); a
+# background task ships the buffer as one POST /record/batch when it reaches
+# `max_samples` or every `flush_interval_s`, whichever comes first. While a
+# send is slow the buffer is capped at `max_buffer` (oldest samples go first),
+# and a batch the manager doesn't take is dropped rather than retried:
+# latency samples are only worth anything while they are fresh.
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+class SampleReporter:
+    """
+    send(samples) ships a list of (backend, latency_s, status_code).
+    on_flush(sent, dropped) is called after every flush attempt.
+    """
+    def __init__(self, send, max_samples=2000, flush_interval_s=0.5, max_buffer=50000, on_flush=None):
+        self.send = send
+        self.max_samples = max_samples
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max_buffer
+        self.on_flush = on_flush
+        self.buffer = []
+        self.dropped = 0
+        self._full = asyncio.Event()
+        self._task = None
+
+    def add(self, backend, latency_s, status):
+        self.buffer.append((backend, latency_s, status))
+        self._trim()
+        if len(self.buffer) >= self.max_samples:
+            self._full.set()
+
+    def _trim(self):
+        excess = len(self.buffer) - self.max_buffer
+        if excess > 0:
+            del self.buffer[:excess]
+            self.dropped += excess
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self._full.clear()
+        while self.buffer:
+            batch, self.buffer = self.buffer[:self.max_samples], self.buffer[self.max_samples:]
+            try:
+                await self.send(batch)
+            except Exception as e:
+                log.debug("sample report failed: %s", e)
+                self.dropped += len(batch)
+                self._report(0)
+                return
+            self._report(len(batch))
+
+    def _report(self, sent):
+        dropped, self.dropped = self.dropped, 0
+        if self.on_flush:
+            self.on_flush(sent, dropped)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            pass
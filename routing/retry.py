@@ -0,0 +1,34 @@
+# routing/retry.py
+import time
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of real traffic so they can't amplify an outage.
+    Every incoming request deposits `ratio` tokens and every retry spends one,
+    so retries stay below ratio * requests (e.g. 0.1 = at most 10% extra load).
+    `min_per_s` tokens also trickle in over time so a quiet router can still
+    retry; the balance is capped at `max_tokens` and starts at `initial_tokens`
+    (full by default). Shared by all backends.
+    """
+    def __init__(self, ratio=0.1, min_per_s=1.0, max_tokens=None, initial_tokens=None, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.max_tokens = max_tokens if max_tokens is not None else max(10.0, min_per_s * 10)
+        self.clock = clock
+        self.tokens = self.max_tokens if initial_tokens is None else min(self.max_tokens, initial_tokens)
+        self._last = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._last) * self.min_per_s)
+        self._last = now
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self):
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
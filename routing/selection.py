@@ -0,0 +1,49 @@
+# routing/selection.py
+import random
+
+class AliasTable:
+    """
+    Weighted random choice in O(1) per pick (Vose's alias method).
+    Building is O(n), so build once per weight change, not per request.
+    Non-positive weights are never picked unless every weight is, in which
+    case the pick is uniform.
+    """
+    __slots__ = ("names", "prob", "alias", "n")
+
+    def __init__(self, names, weights):
+        self.names = list(names)
+        self.n = n = len(self.names)
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        if n == 0:
+            return
+        ws = [w if w > 0.0 else 0.0 for w in weights]
+        total = sum(ws)
+        if total <= 0.0:
+            return
+        scaled = [w * n / total for w in ws]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # leftovers are 1.0 up to float rounding
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return self.n
+
+    def pick(self, rand=random.random):
+        if not self.n:
+            return None
+        r = rand() * self.n
+        i = int(r)
+        if i >= self.n:
+            i = self.n - 1
+        # reuse the fractional part of the same draw for the coin flip
+        return self.names[i] if (r - i) < self.prob[i] else self.names[self.alias[i]]
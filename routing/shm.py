@@ -0,0 +1,202 @@
+# routing/shm.py
+# Shared-memory state for running the router with several worker processes
+# (uvicorn --workers N). One mmap'd file holds:
+#   - the weight snapshot, written by whichever worker currently leads
+#     (polls/streams the manager) and read by all others,
+#   - per-backend in-flight counts, one column per worker.
+# Reads never take a lock: the weight snapshot sits behind a seqlock and each
+# in-flight column has exactly one writer. Locks (flock) are only taken for
+# the rare writes that touch shared structure: publishing weights, adding a
+# backend name, claiming or releasing a worker column.
+import fcntl
+import json
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+MAGIC = b"AGR1"
+# magic, max_backends, max_workers, n_names, seq, updated_at (wall clock), weights_len, owner
+HEADER = struct.Struct("<4sIIIQdQQ")
+NAME_BYTES = 56
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class SharedTable:
+    def __init__(self, path, max_backends=256, max_workers=64, weights_bytes=1 << 20):
+        self.path = path
+        self.max_backends = max_backends
+        self.max_workers = max_workers
+        self.weights_bytes = weights_bytes
+        self._pids_off = HEADER.size
+        self._names_off = self._pids_off + 8 * max_workers
+        self._inflight_off = self._names_off + NAME_BYTES * max_backends
+        self._weights_off = self._inflight_off + 8 * max_workers * max_backends
+        self.size = self._weights_off + weights_bytes
+        self._row = struct.Struct(f"<{max_workers}q")
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        self._leader_fd = None
+        with self._locked():
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fresh = os.fstat(fd).st_size != self.size
+                if fresh:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                self.mm = mmap.mmap(fd, self.size)
+            finally:
+                os.close(fd)
+            header = HEADER.unpack_from(self.mm, 0)
+            # workers of one router share a parent (the uvicorn supervisor); anything else in
+            # the file is left over from an earlier run, whose pids may since have been reused
+            owner = os.getppid()
+            if fresh or header[0] != MAGIC or header[1:3] != (max_backends, max_workers) or header[7] != owner:
+                self.mm[:] = bytes(self.size)
+                HEADER.pack_into(self.mm, 0, MAGIC, max_backends, max_workers, 0, 0, 0.0, 0, owner)
+        self.worker = None
+        self._index = {}  # name -> slot, append-only so safe to cache
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _header(self):
+        return HEADER.unpack_from(self.mm, 0)
+
+    def _set_header(self, **fields):
+        magic, mb, mw, n, seq, updated_at, wlen, owner = self._header()
+        HEADER.pack_into(self.mm, 0, magic, mb, mw, fields.get("n_names", n), fields.get("seq", seq),
+                         fields.get("updated_at", updated_at), fields.get("weights_len", wlen), owner)
+
+    # --- workers -------------------------------------------------------
+
+    def claim_worker(self):
+        # take a free (or dead worker's) in-flight column; its old counts are void
+        with self._locked():
+            for i in range(self.max_workers):
+                off = self._pids_off + 8 * i
+                (pid,) = struct.unpack_from("<q", self.mm, off)
+                if pid == 0 or not _alive(pid):
+                    struct.pack_into("<q", self.mm, off, os.getpid())
+                    self._zero_column(i)
+                    self.worker = i
+                    return i
+        raise RuntimeError(f"all {self.max_workers} worker slots in {self.path} are taken")
+
+    def release_worker(self):
+        if self.worker is None:
+            return
+        with self._locked():
+            self._zero_column(self.worker)
+            struct.pack_into("<q", self.mm, self._pids_off + 8 * self.worker, 0)
+        self.worker = None
+
+    def _zero_column(self, i):
+        for slot in range(self.max_backends):
+            struct.pack_into("<q", self.mm, self._inflight_off + 8 * (slot * self.max_workers + i), 0)
+
+    def try_lead(self):
+        # non-blocking; the lock is held until this process exits or close()
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(self.path + ".leader", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
+
+    # --- in-flight counts ----------------------------------------------
+
+    def _lookup(self, name):
+        slot = self._index.get(name)
+        if slot is None:
+            n = self._header()[3]
+            for i in range(len(self._index), n):
+                raw = bytes(self.mm[self._names_off + NAME_BYTES * i:self._names_off + NAME_BYTES * (i + 1)])
+                self._index[raw.rstrip(b"\0").decode()] = i
+            slot = self._index.get(name)
+        return slot
+
+    def _slot(self, name):
+        slot = self._lookup(name)
+        if slot is None:
+            with self._locked():
+                slot = self._lookup(name)
+                if slot is None:
+                    n = self._header()[3]
+                    encoded = name.encode()
+                    if n >= self.max_backends or len(encoded) > NAME_BYTES:
+                        raise ValueError(f"cannot add backend {name!r} to {self.path}")
+                    off = self._names_off + NAME_BYTES * n
+                    self.mm[off:off + NAME_BYTES] = encoded.ljust(NAME_BYTES, b"\0")
+                    self._set_header(n_names=n + 1)  # publish the name only once it is written
+                    slot = self._index[name] = n
+        return slot
+
+    def add_inflight(self, name, delta):
+        # only this worker writes its column, so no lock
+        off = self._inflight_off + 8 * (self._slot(name) * self.max_workers + self.worker)
+        (v,) = struct.unpack_from("<q", self.mm, off)
+        struct.pack_into("<q", self.mm, off, v + delta)
+
+    def inflight(self, name):
+        slot = self._lookup(name)
+        if slot is None:
+            return 0
+        return sum(self._row.unpack_from(self.mm, self._inflight_off + 8 * slot * self.max_workers))
+
+    # --- weights -------------------------------------------------------
+
+    def seq(self):
+        return HEADER.unpack_from(self.mm, 0)[4]
+
+    def publish_weights(self, snapshot, updated_at):
+        data = json.dumps(snapshot, separators=(",", ":")).encode()
+        if len(data) > self.weights_bytes:
+            raise ValueError(f"weights snapshot is {len(data)} bytes, {self.path} holds {self.weights_bytes}")
+        with self._locked():
+            seq = self.seq()
+            self._set_header(seq=seq + 1)  # odd: write in progress
+            self.mm[self._weights_off:self._weights_off + len(data)] = data
+            self._set_header(seq=seq + 2, updated_at=updated_at, weights_len=len(data))
+
+    def touch(self, updated_at):
+        # a refresh that changed nothing still proves the weights are fresh
+        with self._locked():
+            self._set_header(updated_at=updated_at)
+
+    def updated_at(self):
+        return self._header()[5] or None
+
+    def read_weights(self):
+        # seqlock read: retry while a write is in progress or happened underneath us
+        while True:
+            seq = self.seq()
+            if seq % 2:
+                continue
+            wlen = self._header()[6]
+            data = bytes(self.mm[self._weights_off:self._weights_off + wlen])
+            if self.seq() == seq:
+                return seq, (json.loads(data) if data else {})
+
+    def close(self):
+        self.release_worker()
+        if self._leader_fd is not None:
+            os.close(self._leader_fd)
+            self._leader_fd = None
+        os.close(self._lock_fd)
+        self.mm.close()
@@ -0,0 +1,117 @@
+# routing/stats.py
+# Router-local load signals fed to the balancing policies.
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .deadline import DeadlineExceeded
+
+class LatencyWindow:
+    """
+    The last `size` successful latencies of one backend. Quantiles are
+    re-sorted at most every `refresh_every` samples, so reads are O(1).
+    """
+    def __init__(self, size=200, refresh_every=20):
+        self.samples = deque(maxlen=size)
+        self.refresh_every = refresh_every
+        self._since_sort = 0
+        self._sorted = []
+
+    def add(self, latency_ms):
+        self.samples.append(latency_ms)
+        self._since_sort += 1
+
+    def quantile(self, q):
+        if self._since_sort >= self.refresh_every or len(self._sorted) < min(len(self.samples), self.refresh_every):
+            self._sorted = sorted(self.samples)
+            self._since_sort = 0
+        if not self._sorted:
+            return None
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    def __len__(self):
+        return len(self.samples)
+
+class BackendStats:
+    """
+    What this router has seen of each backend: requests currently in flight,
+    an EWMA of observed latency and a window of recent successful latencies
+    for quantiles. All update the moment a request starts or finishes, so
+    policies react to a slow backend within milliseconds instead of waiting
+    for the manager's next weight refresh.
+    """
+    def __init__(self, alpha=0.3, error_penalty_ms=1000.0, window=200):
+        self.alpha = alpha
+        self.error_penalty_ms = error_penalty_ms
+        self.window = window
+        self.inflight = {}  # this process's requests
+        self.shared = None  # routing.shm.SharedTable when running several workers
+        self.ewma_ms = {}
+        self.latencies = {}
+        self.fleet_ms = None  # EWMA over every observation, the prior for unseen backends
+
+    def observe(self, name, latency_ms):
+        prev = self.ewma_ms.get(name)
+        self.ewma_ms[name] = latency_ms if prev is None else self.alpha * latency_ms + (1 - self.alpha) * prev
+        self.fleet_ms = latency_ms if self.fleet_ms is None else self.alpha * latency_ms + (1 - self.alpha) * self.fleet_ms
+
+    @contextmanager
+    def track(self, name):
+        self.inflight[name] = self.inflight.get(name, 0) + 1
+        if self.shared is not None:
+            self.shared.add_inflight(name, 1)
+        t0 = time.perf_counter()
+        ok = cancelled = skipped = False
+        try:
+            yield
+            ok = True
+        except asyncio.CancelledError:
+            cancelled = True  # e.g. the losing side of a hedge: not the backend's fault
+            raise
+        except DeadlineExceeded:
+            skipped = True  # the backend refused expired work; its latency says nothing
+            raise
+        finally:
+            self.inflight[name] -= 1
+            if self.shared is not None:
+                self.shared.add_inflight(name, -1)
+            latency_ms = (time.perf_counter() - t0) * 1000.0
+            if ok:
+                self.observe(name, latency_ms)
+                w = self.latencies.get(name)
+                if w is None:
+                    w = self.latencies[name] = LatencyWindow(self.window)
+                w.add(latency_ms)
+            elif cancelled:
+                self.observe(name, latency_ms)  # a lower bound, still worth knowing
+            elif not skipped:
+                # a backend that fails fast must not look like a fast backend
+                self.observe(name, max(latency_ms, self.error_penalty_ms))
+
+    def quantile(self, name, q, min_samples=1):
+        w = self.latencies.get(name)
+        if w is None or len(w) < min_samples:
+            return None
+        return w.quantile(q)
+
+    def remove(self, name):
+        # the backend left the fleet; requests still in flight to it keep their count
+        self.ewma_ms.pop(name, None)
+        self.latencies.pop(name, None)
+        if not self.inflight.get(name):
+            self.inflight.pop(name, None)
+
+    def outstanding(self, name):
+        # requests in flight to `name` from every worker of this router
+        if self.shared is not None:
+            return self.shared.inflight(name)
+        return self.inflight.get(name, 0)
+
+    def cost(self, name):
+        # expected wait if we add one more request: queue ahead of us times service time.
+        # backends with no samples yet borrow the fleet-wide latency (O(1), fine for large fleets).
+        lat = self.ewma_ms.get(name)
+        if lat is None:
+            lat = self.fleet_ms if self.fleet_ms is not None else 1.0
+        return (self.outstanding(name) + 1) * max(lat, 0.001)
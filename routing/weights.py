@@ -0,0 +1,156 @@
+# routing/weights.py
+# Router-local copy of the manager's weight map.
+import asyncio
+import time
+
+POLL_INTERVAL = 1.0
+
+def _to_weight(v):
+    try:
+        return float(v)
+    except Exception:
+        try:
+            return float(v.get("weight", 1.0))
+        except Exception:
+            return 1.0
+
+def normalize_weights(raw):
+    """
+    Turn either manager response shape into {name: {"weight": float, "healthy": 0/1, ...}}.
+    manager.py returns bare scores, manager/manager.py returns {"ewma_ms", "healthy"} dicts.
+    """
+    out = {}
+    for k, v in raw.items():
+        entry = dict(v) if isinstance(v, dict) else {}
+        entry["weight"] = _to_weight(v)
+        try:
+            entry["healthy"] = int(entry.get("healthy", 1))
+        except Exception:
+            entry["healthy"] = 1
+        out[k] = entry
+    return out
+
+class WeightTable:
+    """
+    Router-local copy of the manager's weights, refreshed in the background.
+
+    Readers never wait on the manager: get() returns the last good snapshot,
+    which is kept as-is when a refresh fails. age() reports how stale it is.
+
+    With a subscribe callable (ManagerClient.subscribe_weights) updates are
+    pushed by the manager; polling only runs while the stream has been silent
+    for longer than stream_stale_after, e.g. the manager has no stream endpoint.
+
+    With a shared table (routing.shm.SharedTable) only one worker process
+    talks to the manager and publishes what it gets; the others follow the
+    table, and one of them takes over if the leader goes away.
+    """
+
+    def __init__(self, fetch, interval=POLL_INTERVAL, subscribe=None, stream_stale_after=30.0, shared=None):
+        self._fetch = fetch  # async callable returning the raw /weights payload
+        self._subscribe = subscribe
+        self.interval = interval
+        self.stream_stale_after = stream_stale_after
+        self.snapshot = {}
+        self.version = 0  # bumped whenever the snapshot content changes
+        self.updated_at = None  # time.monotonic() of the last good refresh
+        self.streamed_at = None  # time.monotonic() of the last stream update/keepalive
+        self.failures = 0
+        self.last_error = None
+        self._tasks = []
+        self.shared = shared
+        self.leader = shared is None
+        self._shared_seq = None
+
+    def get(self):
+        if not self.leader:
+            # lock-free: one header read per call, the snapshot is re-read only when it changed
+            seq = self.shared.seq()
+            if seq != self._shared_seq and seq % 2 == 0:
+                self._shared_seq, snapshot = self.shared.read_weights()
+                self._replace(snapshot)
+        return self.snapshot
+
+    def age(self):
+        if not self.leader:
+            updated_at = self.shared.updated_at()
+            return None if updated_at is None else max(0.0, time.time() - updated_at)
+        if self.updated_at is None:
+            return None
+        return time.monotonic() - self.updated_at
+
+    def _refreshed(self, snapshot):
+        changed = self._replace(snapshot)
+        self.updated_at = time.monotonic()
+        self.last_error = None
+        if self.shared is not None:
+            if changed or self._shared_seq is None:
+                self.shared.publish_weights(self.snapshot, time.time())
+                self._shared_seq = self.shared.seq()
+            else:
+                self.shared.touch(time.time())
+
+    async def refresh_once(self):
+        try:
+            raw = await self._fetch()
+            if not isinstance(raw, dict):
+                raise ValueError("weights payload is not a dict")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            return False
+        self._refreshed(normalize_weights(raw))
+        return True
+
+    def streaming(self):
+        return self.streamed_at is not None and time.monotonic() - self.streamed_at < self.stream_stale_after
+
+    def _replace(self, snapshot):
+        # keep the old object when nothing changed so consumers caching on it
+        # (routing.app.routable, policy alias tables) don't rebuild needlessly
+        if snapshot != self.snapshot:
+            self.snapshot = snapshot
+            self.version += 1
+            return True
+        return False
+
+    def apply_stream(self, raw):
+        self.streamed_at = time.monotonic()
+        self._refreshed(normalize_weights(raw))
+
+    async def refresh_loop(self):
+        while True:
+            if not self.streaming():
+                await self.refresh_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if not self._tasks:
+            if self.shared is not None and not self.shared.try_lead():
+                self._tasks.append(asyncio.create_task(self.follow_loop()))
+            else:
+                self._lead()
+        return self._tasks
+
+    def _lead(self):
+        self.leader = True
+        self._tasks.append(asyncio.create_task(self.refresh_loop()))
+        if self._subscribe is not None:
+            self._tasks.append(asyncio.create_task(self._subscribe(self.apply_stream)))
+
+    async def follow_loop(self):
+        # the leader's flock is released when its process dies; then we take over
+        while not self.shared.try_lead():
+            await asyncio.sleep(self.interval)
+        self.get()  # start from what the old leader published
+        self._lead()
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
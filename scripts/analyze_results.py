@@ -68,7 +68,7 @@ if mx_files:
     print(f"\nInspecting router metrics file: {mx_files[-1]}")
     with open(mx_files[-1]) as f:
         text = f.read()
-    for metric in ['router_latency_seconds_count', 'router_latency_seconds_sum', 'router_requests_total', 'router_failed_total']:
+    for metric in ['aegis_router_request_latency_ms_count', 'aegis_router_request_latency_ms_sum', 'aegis_router_requests_total']:
         for line in text.splitlines():
             if line.startswith(metric):
                 print("  "+line)